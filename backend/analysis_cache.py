@@ -0,0 +1,77 @@
+import json
+import sqlite3
+import hashlib
+import threading
+from database import DB_NAME
+
+# Content-addressed cache of AI analysis results for revision PDFs.
+# Keyed by sha256(PDF bytes) + prompt version, so re-analysis after a reset script,
+# backlog reprocessing and reposted identical PDFs skip the Gemini round trip.
+# Changing the prompt version only invalidates entries of the old version.
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class AnalysisCache:
+    """
+    Safe to use from worker threads (own connection + lock).
+    """
+    def __init__(self, prompt_version, db_path=DB_NAME):
+        self.prompt_version = prompt_version
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_conn(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self.conn
+
+    def lookup(self, content_hash):
+        """
+        Returns the cached result dict for this PDF and prompt version, or None.
+        """
+        with self.lock:
+            conn = self._get_conn()
+            row = conn.execute("""
+                SELECT result FROM analysis_cache WHERE content_hash = ? AND prompt_version = ?
+            """, (content_hash, self.prompt_version)).fetchone()
+            if not row:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            conn.execute("""
+                UPDATE analysis_cache SET hits = hits + 1, last_hit_at = CURRENT_TIMESTAMP
+                WHERE content_hash = ? AND prompt_version = ?
+            """, (content_hash, self.prompt_version))
+            conn.commit()
+            return json.loads(row[0])
+
+    def store(self, content_hash, result):
+        if not result:
+            return # Failed analyses are retried, not cached
+        with self.lock:
+            conn = self._get_conn()
+            conn.execute("""
+                INSERT OR REPLACE INTO analysis_cache (content_hash, prompt_version, result)
+                VALUES (?, ?, ?)
+            """, (content_hash, self.prompt_version, json.dumps(result, ensure_ascii=False)))
+            conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        return f"analysis cache [{self.prompt_version}]: {self.hits}/{total} hits ({rate:.0f}%)"
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,180 @@
+import sqlite3
+import datetime
+
+# Durable producer/consumer queue between the TDnet poller (producer) and
+# the AI analysis workers (consumers), stored in the analysis_queue table.
+#
+# priority: 0 = watchlisted ticker (someone has an alert on it), 1 = others
+# status:   pending -> processing -> done / failed
+#           deferred = accepted under backpressure, promoted to pending when the queue drains
+
+PRIORITY_WATCHED = 0
+PRIORITY_NORMAL = 1
+
+MAX_PENDING = 200 # Above this, non-watchlisted items are deferred
+LOW_WATERMARK = 50 # Deferred items are promoted below this depth
+MAX_ATTEMPTS = 3
+STALE_PROCESSING_MINUTES = 30 # Reclaim items from crashed workers
+
+def _now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def pending_depth(conn):
+    return conn.execute("SELECT COUNT(*) FROM analysis_queue WHERE status = 'pending'").fetchone()[0]
+
+def enqueue(conn, items):
+    """
+    items: iterable of (revision_id, is_watched).
+    Watchlisted items are always queued as pending; others are deferred while
+    the queue is above MAX_PENDING (backpressure). Already queued ids are ignored.
+    Returns the number of new queue rows.
+    """
+    items = list(items)
+    if not items:
+        return 0
+    over_limit = pending_depth(conn) >= MAX_PENDING
+    rows = []
+    for revision_id, is_watched in items:
+        priority = PRIORITY_WATCHED if is_watched else PRIORITY_NORMAL
+        status = 'deferred' if (over_limit and not is_watched) else 'pending'
+        rows.append((revision_id, priority, status, _now()))
+    before = conn.total_changes
+    conn.executemany("""
+        INSERT OR IGNORE INTO analysis_queue (revision_id, priority, status, enqueued_at)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return conn.total_changes - before
+
+def enqueue_unanalyzed(conn):
+    """
+    Queues revisions with ai_analyzed = 0 that are not queued yet (e.g. after a reset script).
+    """
+    rows = conn.execute("""
+        SELECT r.id, EXISTS(SELECT 1 FROM alerts a WHERE a.ticker = r.ticker) AS watched
+        FROM revisions r
+        WHERE r.ai_analyzed = 0
+          AND r.source_url LIKE '%.pdf'
+          AND r.id NOT IN (SELECT revision_id FROM analysis_queue WHERE status IN ('pending', 'processing', 'deferred'))
+    """).fetchall()
+    if not rows:
+        return 0
+    # Re-analysis after a reset: clear the finished queue row first
+    conn.executemany("DELETE FROM analysis_queue WHERE revision_id = ? AND status IN ('done', 'failed')",
+                     [(r[0],) for r in rows])
+    conn.commit()
+    return enqueue(conn, [(r[0], bool(r[1])) for r in rows])
+
+def promote_deferred(conn):
+    """
+    Moves deferred items back to pending once the queue has drained below LOW_WATERMARK.
+    """
+    depth = pending_depth(conn)
+    if depth >= LOW_WATERMARK:
+        return 0
+    c = conn.execute("""
+        UPDATE analysis_queue SET status = 'pending'
+        WHERE revision_id IN (
+            SELECT revision_id FROM analysis_queue
+            WHERE status = 'deferred'
+            ORDER BY enqueued_at
+            LIMIT ?
+        )
+    """, (MAX_PENDING - depth,))
+    conn.commit()
+    return c.rowcount
+
+def claim_next(conn):
+    """
+    Atomically claims the highest-priority, oldest pending item.
+    Returns the revision_id or None.
+    """
+    stale = (datetime.datetime.now() - datetime.timedelta(minutes=STALE_PROCESSING_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE analysis_queue SET status = 'pending' WHERE status = 'processing' AND started_at < ?", (stale,))
+        row = conn.execute("""
+            SELECT revision_id FROM analysis_queue
+            WHERE status = 'pending'
+            ORDER BY priority, enqueued_at, revision_id
+            LIMIT 1
+        """).fetchone()
+        if not row:
+            conn.commit()
+            return None
+        conn.execute("""
+            UPDATE analysis_queue SET status = 'processing', started_at = ?, attempts = attempts + 1
+            WHERE revision_id = ?
+        """, (_now(), row[0]))
+        conn.commit()
+        return row[0]
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def peek_pending(conn, limit):
+    """
+    Returns the PDF URLs of the next pending items in claim order (without claiming them).
+    """
+    rows = conn.execute("""
+        SELECT r.source_url FROM analysis_queue q
+        JOIN revisions r ON r.id = q.revision_id
+        WHERE q.status = 'pending' AND r.source_url IS NOT NULL
+        ORDER BY q.priority, q.enqueued_at, q.revision_id
+        LIMIT ?
+    """, (limit,)).fetchall()
+    return [r[0] for r in rows]
+
+def mark_done(conn, revision_id):
+    conn.execute("UPDATE analysis_queue SET status = 'done', finished_at = ? WHERE revision_id = ?", (_now(), revision_id))
+    conn.commit()
+
+def mark_failed(conn, revision_id, error):
+    """
+    Retries up to MAX_ATTEMPTS, then leaves the item as failed and marks the revision
+    ai_analyzed = 2 (like process_backlog), so enqueue_unanalyzed does not queue it again.
+    """
+    conn.execute("""
+        UPDATE analysis_queue
+        SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+            last_error = ?, finished_at = ?
+        WHERE revision_id = ?
+    """, (MAX_ATTEMPTS, str(error)[:200], _now(), revision_id))
+    conn.execute("""
+        UPDATE revisions SET ai_analyzed = 2, ai_summary = COALESCE(ai_summary, 'Analysis Failed')
+        WHERE id = ? AND ai_analyzed = 0
+          AND EXISTS (SELECT 1 FROM analysis_queue WHERE revision_id = ? AND status = 'failed')
+    """, (revision_id, revision_id))
+    conn.commit()
+
+def release(conn, revision_id):
+    """
+    Puts a claimed item back without counting the attempt (e.g. quota exceeded).
+    """
+    conn.execute("""
+        UPDATE analysis_queue SET status = 'pending', attempts = MAX(attempts - 1, 0)
+        WHERE revision_id = ?
+    """, (revision_id,))
+    conn.commit()
+
+def queue_stats(conn):
+    """
+    Returns { status: count, 'oldest_pending_age_sec': int|None, 'watched_pending': int }
+    """
+    stats = {status: count for status, count in conn.execute(
+        "SELECT status, COUNT(*) FROM analysis_queue GROUP BY status").fetchall()}
+    oldest = conn.execute("SELECT MIN(enqueued_at) FROM analysis_queue WHERE status IN ('pending', 'deferred')").fetchone()[0]
+    stats['oldest_pending_age_sec'] = None
+    if oldest:
+        age = datetime.datetime.now() - datetime.datetime.strptime(oldest, '%Y-%m-%d %H:%M:%S')
+        stats['oldest_pending_age_sec'] = int(age.total_seconds())
+    stats['watched_pending'] = conn.execute(
+        "SELECT COUNT(*) FROM analysis_queue WHERE status = 'pending' AND priority = ?", (PRIORITY_WATCHED,)).fetchone()[0]
+    return stats
+
+def format_stats(stats):
+    age = stats.get('oldest_pending_age_sec')
+    age_text = f"{age // 60}m{age % 60:02d}s" if age is not None else "-"
+    return (f"pending={stats.get('pending', 0)} (watched={stats.get('watched_pending', 0)}) "
+            f"deferred={stats.get('deferred', 0)} processing={stats.get('processing', 0)} "
+            f"done={stats.get('done', 0)} failed={stats.get('failed', 0)} oldest={age_text}")
@@ -0,0 +1,57 @@
+import time
+import datetime
+import sys
+import os
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import get_db_connection
+import analysis_queue
+
+# AI analysis consumer for revisions queued by poll_tdnet / fetch_tdnet.
+# Runs independently of the poller, so slow Gemini calls never delay TDnet detection.
+# Several workers can run side by side (claims are atomic).
+BATCH_ITEMS = 5 # Re-check deferred items / print metrics after this many analyses
+IDLE_SLEEP = 10 # Queue empty (Gemini pacing is done by llm_scheduler)
+STATS_INTERVAL = 300 # Metrics line even when idle
+
+def print_stats(conn):
+    stats = analysis_queue.queue_stats(conn)
+    print(f"[Worker] {datetime.datetime.now().strftime('%H:%M:%S')} queue: {analysis_queue.format_stats(stats)}")
+
+def run_worker():
+    # Imported here: analyze_revisions_ai exits when GEMINI_API_KEY is missing
+    from analyze_revisions_ai import process_revisions
+
+    print("Starting AI Analysis Worker...")
+    last_stats = 0
+    while True:
+        try:
+            conn = get_db_connection()
+            promoted = analysis_queue.promote_deferred(conn)
+            if promoted:
+                print(f"[Worker] Promoted {promoted} deferred items.")
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                print_stats(conn)
+                last_stats = time.monotonic()
+            conn.close()
+
+            processed = process_revisions(max_items=BATCH_ITEMS)
+            if processed == 0:
+                time.sleep(IDLE_SLEEP)
+
+        except KeyboardInterrupt:
+            print("Stopping Worker...")
+            break
+        except Exception as e:
+            print(f"Worker Error: {e}")
+            time.sleep(60) # Sleep even on error to avoid rapid loop
+
+if __name__ == "__main__":
+    if "--stats" in sys.argv:
+        conn = get_db_connection()
+        print_stats(conn)
+        conn.close()
+    else:
+        run_worker()
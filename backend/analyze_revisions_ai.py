@@ -1,11 +1,17 @@
 import os
 import time
 import requests
-import tempfile
 import json
 import sqlite3
 import google.generativeai as genai
 from database import get_db_connection
+import analysis_queue
+import notification_queue
+from pdf_prefetch import PdfPrefetcher, download_pdf
+from pdf_extract import analyze_locally
+from xbrl_extract import numbers_from_row
+from analysis_cache import AnalysisCache, file_sha256
+from llm_scheduler import gemini_flash, LANE_LIVE, is_rate_limit_error, parse_retry_after
 from dotenv import load_dotenv
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=True)
@@ -18,15 +24,28 @@ if not GEMINI_API_KEY:
 
 genai.configure(api_key=GEMINI_API_KEY)
 
-def analyze_revision_pdf(pdf_path, title):
+PREFETCH_AHEAD = 4 # Queued PDFs downloaded in the background
+PDF_TOKEN_ESTIMATE = 3000 # Prompt + a few PDF pages (~258 tokens/page)
+
+# Bump when the prompt or the output JSON changes: cached results of older versions are ignored
+PROMPT_VERSION = "revision-v3"
+ANALYSIS_CACHE = AnalysisCache(PROMPT_VERSION)
+
+# Documents handled by the local extraction tier / result cache / Gemini (this process)
+analysis_stats = {'local': 0, 'cache': 0, 'llm': 0}
+
+def analyze_revision_pdf(pdf_path, title, lane=LANE_LIVE):
     """
-    Uploads PDF to Gemini and asks for analysis.
+    Uploads PDF to Gemini and asks for analysis (paced by the shared llm_scheduler quota).
     Returns: { "is_upward": bool, "revision_rate_op": float, "summary": str } or None
     """
     try:
-        # Upload file
+        # Upload file (inside the same quota/lane as the generate call: 429s pause every caller)
         print(f"  Uploading PDF to Gemini...")
-        sample_file = genai.upload_file(path=pdf_path, display_name="Revision PDF")
+        sample_file = gemini_flash.call(
+            lambda: genai.upload_file(path=pdf_path, display_name="Revision PDF"),
+            lane=lane
+        )
         
         # Wait for processing
         while sample_file.state.name == "PROCESSING":
@@ -76,7 +95,15 @@ def analyze_revision_pdf(pdf_path, title):
         }}
         """
 
-        # ... (Model selection logic remains) ...
+        model = genai.GenerativeModel('gemini-1.5-flash')
+        response = gemini_flash.call(
+            lambda: model.generate_content(
+                [sample_file, prompt],
+                generation_config={"response_mime_type": "application/json"}
+            ),
+            lane=lane,
+            tokens=PDF_TOKEN_ESTIMATE
+        )
         
         # Extract JSON
         text = response.text
@@ -89,101 +116,209 @@ def analyze_revision_pdf(pdf_path, title):
         return data
 
     except Exception as e:
-        # Error handling ...
+        # 429 / ResourceExhausted: let the caller put the item back and retry later
+        if "QUOTA_EXCEEDED" in str(e):
+            raise
+        if is_rate_limit_error(e):
+            # e.g. get_file while polling; pause the other callers too
+            gemini_flash.report_rate_limited(parse_retry_after(e))
+            raise Exception(f"QUOTA_EXCEEDED: {e}")
+        print(f"  Gemini analysis error: {e}")
         return None
 
-# ... (process_revisions logic update) ...
+def analyze_pdf(pdf_path, title, lane=LANE_LIVE):
+    """
+    Parses the standard revision table locally; otherwise reuses a cached Gemini result
+    for the same PDF content + PROMPT_VERSION, and only then calls Gemini.
+    Returns (result, source) with source 'local', 'cache' or 'llm'.
+    """
+    result = analyze_locally(pdf_path, title)
+    if result:
+        analysis_stats['local'] += 1
+        print("  Parsed locally (standard revision table).")
+        return result, 'local'
+
+    content_hash = file_sha256(pdf_path)
+    result = ANALYSIS_CACHE.lookup(content_hash)
+    if result:
+        analysis_stats['cache'] += 1
+        print(f"  Reused cached analysis ({PROMPT_VERSION}).")
+        return result, 'cache'
 
-            if result:
-                is_upward = result.get('is_upward') 
-                rate = result.get('revision_rate_op', 0.0)
-                summary = result.get('summary', '解析不可')
-                quarter = result.get('quarter', None) 
-                
-                # Dividend Extraction
-                div_data = result.get('dividend', {})
-                div_forecast = div_data.get('annual_forecast', None)
-                is_div_hike = 1 if div_data.get('is_hike') else 0
-                rights_month = div_data.get('rights_month', None)
-                payment_month = div_data.get('payment_month', None)
+    analysis_stats['llm'] += 1
+    result = analyze_revision_pdf(pdf_path, title, lane)
+    ANALYSIS_CACHE.store(content_hash, result)
+    return result, 'llm'
+
+def format_analysis_stats():
+    total = sum(analysis_stats.values())
+    rate = (analysis_stats['local'] / total * 100) if total else 0
+    return (f"local extraction {analysis_stats['local']}/{total} ({rate:.0f}%), "
+            f"cached {analysis_stats['cache']}, Gemini {analysis_stats['llm']}; {ANALYSIS_CACHE.stats()}")
 
-                forecast_data = result.get('forecast_data', None)
-                forecast_data_json = json.dumps(forecast_data, ensure_ascii=False) if forecast_data else None
+def save_result(conn, row, result):
+    """
+    Stores the AI result for one revision and posts strong upward revisions to X.
+    """
+    c = conn.cursor()
+    rev_id = row['id']
+    title = row['title'] or ""
+    ticker = row['ticker']
 
-                print(f"  Result: Up={is_upward}, Rate={rate}%, Div={div_forecast} (Hike={is_div_hike}, Rights={rights_month})")
+    if result:
+        is_upward = result.get('is_upward') 
+        rate = result.get('revision_rate_op', 0.0)
+        summary = result.get('summary', '解析不可')
+        quarter = result.get('quarter', None) 
+        
+        # Dividend Extraction
+        div_data = result.get('dividend') or {}
+        div_forecast = div_data.get('annual_forecast', None)
+        is_div_hike = 1 if div_data.get('is_hike') else 0
+        rights_month = div_data.get('rights_month', None)
+        payment_month = div_data.get('payment_month', None)
+
+        forecast_data = result.get('forecast_data', None)
+        forecast_data_json = json.dumps(forecast_data, ensure_ascii=False) if forecast_data else None
+
+        # XBRL numbers (saved by fetch_tdnet) are exact; they win over the PDF reading
+        xbrl = numbers_from_row(row)
+        if xbrl:
+            is_upward = xbrl['is_upward']
+            rate = xbrl['revision_rate_op']
+            forecast_data_json = row['forecast_data'] or forecast_data_json
+
+        print(f"  Result: Up={is_upward}, Rate={rate}%, Div={div_forecast} (Hike={is_div_hike}, Rights={rights_month})")
+        
+        is_up_int = 1 if is_upward else 0 if is_upward is False else None
+        
+        # Update DB including quarter and dividend
+        c.execute("""
+            UPDATE revisions 
+            SET is_upward = ?, 
+                revision_rate_op = ?,
+                ai_summary = ?,
+                forecast_data = ?,
+                quarter = ?,
+                dividend_forecast_annual = ?,
+                is_dividend_hike = ?,
+                dividend_rights_month = ?,
+                dividend_payment_month = ?,
+                ai_analyzed = 1
+            WHERE id = ?
+        """, (is_up_int, rate, summary, forecast_data_json, quarter, div_forecast, is_div_hike, rights_month, payment_month, rev_id))
+        conn.commit()
+        print("  Saved to DB.")
+
+        # Watchers not alerted at disclosure time (e.g. alert added since) get the analyzed version
+        notified = notification_queue.fan_out(conn, [(rev_id, ticker)])
+        if notified:
+            print(f"  Queued {notified} watcher notifications.")
+
+        # Post to X
+        # Only post if upward AND revision rate >= 5%
+        if is_upward and (rate or 0.0) >= 5.0:
+            try:
+                from send_x import post_to_x
                 
-                is_up_int = 1 if is_upward else 0 if is_upward is False else None
+                # Generate OGP Image URL
+                # api/og?title=...&subtitle=...&type=alert
+                # We use the official domain for generation
+                og_title = f"{row['company_name']} 上方修正"
+                og_subtitle = summary
+                og_url = f"https://rich-investor-news.com/api/og?title={requests.utils.quote(og_title)}&subtitle={requests.utils.quote(og_subtitle)}&type=alert"
                 
-                # Update DB including quarter and dividend
-                c.execute("""
-                    UPDATE revisions 
-                    SET is_upward = ?, 
-                        revision_rate_op = ?,
-                        ai_summary = ?,
-                        forecast_data = ?,
-                        quarter = ?,
-                        dividend_forecast_annual = ?,
-                        is_dividend_hike = ?,
-                        dividend_rights_month = ?,
-                        dividend_payment_month = ?,
-                        ai_analyzed = 1
-                    WHERE id = ?
-                """, (is_up_int, rate, summary, forecast_data_json, quarter, div_forecast, is_div_hike, rights_month, payment_month, rev_id))
-                conn.commit()
-                print("  Saved to DB.")
-
-                # Post to X
-                # Only post if upward AND revision rate >= 5%
-                if is_upward and rate >= 5.0:
-                    try:
-                        from send_x import post_to_x
-                        
-                        # Generate OGP Image URL
-                        # api/og?title=...&subtitle=...&type=alert
-                        # We use the official domain for generation
-                        og_title = f"{row['company_name']} 上方修正"
-                        og_subtitle = summary
-                        og_url = f"https://rich-investor-news.com/api/og?title={requests.utils.quote(og_title)}&subtitle={requests.utils.quote(og_subtitle)}&type=alert"
-                        
-                        # New Logic: Clickable OGP Card
-                        # Post URL to the detail page, which has the OGP meta tags
-                        detail_url = f"https://rich-investor-news.com/revisions/{rev_id}"
-                        
-                        clean_title = title[:30] + "..." if len(title) > 30 else title
-                        
-                        # Message must NOT have media attached for the card to show up
-                        x_msg = f"📈 【AI速報: 上方修正判定】\n{ticker} {row['company_name']}\n\n💡 理由: {summary}\n\n👇 詳細・PDF\n{detail_url}\n\n#株 #決算 #上方修正"
-                        
-                        # Post without media (pass None)
-                        # The URL in text will automatically be cardified by X
-                        tweet_id = post_to_x(x_msg, media_path=None)
-
-                        if tweet_id:
-                            print(f"  -> Posted to X successfully: {tweet_id}")
-                        else:
-                            print("  -> Failed to post to X (Check logs)")
-                    except Exception as e:
-                        print(f"  -> Exception posting to X: {e}")
-                else:
-                    print(f"  -> Skip X post (Verdict: {'Down' if is_upward is False else 'Neutral'})")
+                # New Logic: Clickable OGP Card
+                # Post URL to the detail page, which has the OGP meta tags
+                detail_url = f"https://rich-investor-news.com/revisions/{rev_id}"
                 
-            else:
-                print("  Analysis returned No Data.")
-                # Mark as 2 (Failed)
-                c.execute("UPDATE revisions SET ai_analyzed = 2, ai_summary = 'Analysis Failed' WHERE id = ?", (rev_id,))
-                conn.commit()
+                clean_title = title[:30] + "..." if len(title) > 30 else title
+                
+                # Message must NOT have media attached for the card to show up
+                x_msg = f"📈 【AI速報: 上方修正判定】\n{ticker} {row['company_name']}\n\n💡 理由: {summary}\n\n👇 詳細・PDF\n{detail_url}\n\n#株 #決算 #上方修正"
                 
-            # Sleep longer to be safe (15s)
-            print("  Sleeping 15s to respect Rate Limits...")
-            time.sleep(15)
+                # Post without media (pass None)
+                # The URL in text will automatically be cardified by X
+                tweet_id = post_to_x(x_msg, media_path=None)
+
+                if tweet_id:
+                    print(f"  -> Posted to X successfully: {tweet_id}")
+                else:
+                    print("  -> Failed to post to X (Check logs)")
+            except Exception as e:
+                print(f"  -> Exception posting to X: {e}")
+        else:
+            print(f"  -> Skip X post (Verdict: {'Down' if is_upward is False else 'Neutral'})")
+        
+    else:
+        print("  Analysis returned No Data.")
+        # Mark as 2 (Failed)
+        c.execute("UPDATE revisions SET ai_analyzed = 2, ai_summary = 'Analysis Failed' WHERE id = ?", (rev_id,))
+        conn.commit()
+
+def analyze_revision(conn, row, prefetcher=None):
+    """
+    Analyzes the disclosure PDF (from the prefetch cache) and saves the result.
+    Returns 'local' / 'cache' / 'llm' (how it was analyzed, including 'Analysis Failed'), or None if the download failed.
+    Raises on QUOTA_EXCEEDED.
+    """
+    print(f"\n[AI] Processing {row['ticker']} ({row['id']}): {row['title']}")
+    
+    # Download (usually already on disk)
+    pdf_path = prefetcher.get(row['source_url']) if prefetcher else download_pdf(row['source_url'])
+    if not pdf_path:
+        return None
+    
+    result, source = analyze_pdf(pdf_path, row['title'])
+    save_result(conn, row, result)
+    return source
+
+def process_revisions(max_items=None):
+    """
+    Consumer side of analysis_queue: claims revisions (watchlisted tickers first)
+    and analyzes them one by one until the queue is empty or max_items is reached.
+    Rows with ai_analyzed = 0 that are not queued yet (e.g. after a reset script) are queued first.
+    Returns the number of processed items. Gemini calls are paced by llm_scheduler
+    (quota errors pause the loop and put the item back instead of failing it).
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    
+    added = analysis_queue.enqueue_unanalyzed(conn)
+    if added:
+        print(f"Queued {added} unanalyzed revisions.")
+    
+    processed = 0
+    prefetcher = PdfPrefetcher()
+    while max_items is None or processed < max_items:
+        rev_id = analysis_queue.claim_next(conn)
+        if rev_id is None:
+            break
+        
+        # Download the next PDFs while this one is analyzed / during the rate-limit sleep
+        prefetcher.prefetch(analysis_queue.peek_pending(conn, PREFETCH_AHEAD))
+        
+        row = c.execute("SELECT id, ticker, company_name, title, source_url, prev_op, rev_op, forecast_data FROM revisions WHERE id = ?", (rev_id,)).fetchone()
+        if not row or not row['source_url']:
+            analysis_queue.mark_failed(conn, rev_id, "revision not found or no PDF")
+            continue
+        
+        try:
+            source = analyze_revision(conn, row, prefetcher)
+            if source:
+                analysis_queue.mark_done(conn, rev_id)
+            else:
+                analysis_queue.mark_failed(conn, rev_id, "download failed")
+            processed += 1
             
         except Exception as e:
             if "QUOTA_EXCEEDED" in str(e):
-                print("\n!!! CRITICAL: QUOTA EXCEEDED (429) !!!")
-                print("Stopping script immediately to allow quota recovery.")
-                print("Do NOT mark current row as failed, so it can be retried later.")
-                conn.close()
-                exit(1) # Exit with error code
+                # The scheduler has paused all Gemini callers: put the item back and
+                # wait out the pause before claiming again (it would be re-claimed right away)
+                print("  Quota exceeded. Returning item to the queue.")
+                analysis_queue.release(conn, rev_id)
+                gemini_flash.wait_until_resumed()
+                continue
 
             print(f"  Error processing row: {e}")
             try:
@@ -191,8 +326,13 @@ def analyze_revision_pdf(pdf_path, title):
                 conn.commit()
             except:
                 pass
+            analysis_queue.mark_failed(conn, rev_id, e)
             
+    prefetcher.close()
+    print(f"Analysis queue: {analysis_queue.format_stats(analysis_queue.queue_stats(conn))}")
+    print(f"Analysis: {format_analysis_stats()}, {gemini_flash.status()}")
     conn.close()
+    return processed
 
 if __name__ == "__main__":
     process_revisions()
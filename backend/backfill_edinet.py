@@ -0,0 +1,103 @@
+import sys
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+from fetch_edinet import (get_db_connection, get_tracked_investors,
+                          fetch_edinet_day, select_ownership_reports, save_documents)
+from edinet_holdings import ingest_holdings
+
+# EDINET date-range sweep: reconciles edinet_documents for many dates (missed days, history).
+# documents.json is fetched for several dates in parallel (paced by http_client's EDINET host limit),
+# each date is checkpointed in edinet_sweep_days and finished dates are skipped on the next run.
+#
+# Usage: python backfill_edinet.py [--days 30] [--from 2024-01-01 --to 2024-01-31] [--force]
+
+SWEEP_WORKERS = 4
+DEFAULT_DAYS = 30
+
+def load_finished_dates(conn):
+    rows = conn.execute("SELECT date FROM edinet_sweep_days WHERE status = 'done'").fetchall()
+    return {r[0] for r in rows}
+
+def save_checkpoint(conn, date_str, status, documents, matched, saved):
+    conn.execute("""
+        INSERT INTO edinet_sweep_days (date, status, documents, matched, saved, updated_at)
+        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(date) DO UPDATE SET
+            status=excluded.status,
+            documents=excluded.documents,
+            matched=excluded.matched,
+            saved=excluded.saved,
+            updated_at=excluded.updated_at
+    """, (date_str, status, documents, matched, saved))
+    conn.commit()
+
+def sweep_edinet(start_date=None, end_date=None, days=DEFAULT_DAYS, workers=SWEEP_WORKERS, force=False):
+    """
+    Fetches and saves the ownership reports of every date from end_date back to start_date
+    (default: the last `days` days up to today). Dates checkpointed as done are skipped unless force=True.
+    Reports found here are not posted to X.
+    """
+    today = datetime.date.today()
+    end_date = end_date or today
+    start_date = start_date or end_date - datetime.timedelta(days=days - 1)
+    dates = [end_date - datetime.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    conn = get_db_connection()
+    started = time.monotonic()
+    http_client.metrics.reset()
+
+    investors = get_tracked_investors(conn)
+    finished = set() if force else load_finished_dates(conn)
+    todo = [d for d in dates if d.strftime('%Y-%m-%d') not in finished]
+    print(f"EDINET sweep {start_date} - {end_date}: {len(dates) - len(todo)} dates already done (checkpoint), {len(todo)} to fetch.")
+
+    total_saved = 0
+    errors = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Windows keep the checkpoints close to the fetches
+        for offset in range(0, len(todo), workers * 2):
+            window = todo[offset:offset + workers * 2]
+            results = pool.map(fetch_edinet_day, [d.strftime('%Y-%m-%d') for d in window])
+
+            for j, (d, (status, docs)) in enumerate(zip(window, results)):
+                d_str = d.strftime('%Y-%m-%d')
+                progress = f"[{offset + j + 1}/{len(todo)}] {d_str}"
+                if status == 'error':
+                    # Not checkpointed as done: retried on the next run
+                    save_checkpoint(conn, d_str, 'error', 0, 0, 0)
+                    errors += 1
+                    print(f"{progress}: error (will retry next run)")
+                    continue
+
+                matches = select_ownership_reports(docs, investors)
+                saved = len(save_documents(conn, matches, post=False))
+                total_saved += saved
+                # Today's list is still growing: keep it eligible for the next run
+                save_checkpoint(conn, d_str, 'partial' if d >= today else 'done', len(docs), len(matches), saved)
+                print(f"{progress}: {len(docs)} documents, {len(matches)} ownership reports, saved {saved}")
+
+    if total_saved:
+        print(f"Ingesting holdings for {total_saved} new reports...")
+        ingest_holdings(conn)
+    conn.close()
+    print(f"\nEDINET sweep completed. {total_saved} new reports, {errors} dates with errors "
+          f"in {time.monotonic() - started:.1f}s")
+    http_client.print_metrics()
+    return total_saved
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    def arg(name):
+        return args[args.index(name) + 1] if name in args else None
+
+    sweep_edinet(
+        start_date=parse_date(arg('--from')) if arg('--from') else None,
+        end_date=parse_date(arg('--to')) if arg('--to') else None,
+        days=int(arg('--days') or DEFAULT_DAYS),
+        force='--force' in args,
+    )
@@ -1,4 +1,4 @@
-import requests
+import http_client
 from bs4 import BeautifulSoup
 import datetime
 import time
@@ -23,10 +23,7 @@ def fetch_past_events_for_date(date):
     
     print(f"Fetching Past: {url}")
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        res = requests.get(url, headers=headers, timeout=10)
+        res = http_client.get(url, cache=True) # Past dates are served from the local cache
         res.encoding = res.apparent_encoding
         
         if res.status_code != 200:
@@ -157,7 +154,9 @@ def run_backfill(days_back=365):
         events = fetch_past_events_for_date(current)
         save_events(events)
         current -= datetime.timedelta(days=1)
-        time.sleep(1) # Polite delay
+        # Polite delay (kabutan.jp: 1 req/s) is applied by http_client
+    
+    http_client.print_metrics()
 
 if __name__ == "__main__":
     # Run backfill for roughly 1 year
@@ -1,110 +1,132 @@
-import requests
-from bs4 import BeautifulSoup
+import http_client
 import datetime
 import time
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from database import get_db_connection
+from fetch_tdnet import MAX_PAGES
+from tdnet_parser import TDNET_PAGE_URL, parse_listing
 
-# TDnet Public URL Pattern
-TDNET_LIST_URL = "https://www.release.tdnet.info/inbs/I_list_001_{}.html"
+# Revision-only filter (keywords: keywords.json "tdnet_categories" -> "revision")
+BACKFILL_CATEGORY = "revision"
 
-def backfill_revisions(days_to_backfill=365):
+BACKFILL_WORKERS = 4 # Days fetched in parallel (requests still paced by http_client's TDnet host limit)
+MAX_CONSECUTIVE_MISSING = 5 # Stop after this many 404 days in a row (TDnet retention limit)
+
+def fetch_day(target_date):
+    """
+    Fetches every listing page of one day (worker thread, no DB access).
+    Returns (status, pages, rows) with status 'done', 'missing' (404) or 'error'.
+    """
+    date_str = target_date.strftime('%Y%m%d')
+    rows = []
+    pages = 0
+    try:
+        for page in range(1, MAX_PAGES + 1):
+            res = http_client.get(TDNET_PAGE_URL.format(page, date_str), cache=True) # Past days never change
+            if res.status_code == 404:
+                return ('missing' if page == 1 else 'done'), pages, rows
+            if res.status_code != 200:
+                print(f"  {date_str} page {page}: HTTP {res.status_code}")
+                return 'error', pages, rows
+
+            page_rows = parse_listing(res.content)
+            pages += 1
+            if not page_rows:
+                break
+            rows.extend(page_rows)
+    except Exception as e:
+        print(f"  {date_str}: Error: {e}")
+        return 'error', pages, rows
+    return 'done', pages, rows
+
+def load_finished_days(c):
+    rows = c.execute("SELECT date FROM tdnet_backfill_days WHERE status IN ('done', 'missing')").fetchall()
+    return {r['date'] for r in rows}
+
+def save_day(conn, formatted_date, status, pages, rows):
+    """
+    Writes the day's matching revisions and its checkpoint in one transaction.
+    Returns (matched, saved).
+    """
+    matched = [r for r in rows if BACKFILL_CATEGORY in r.categories] if status == 'done' else []
+    with conn:
+        before = conn.total_changes
+        # 3 = Backfilled/Skipped
+        conn.executemany("""
+            INSERT INTO revisions 
+            (ticker, company_name, revision_date, source_url, quarter, title, ai_analyzed, ai_summary)
+            VALUES (?, ?, ?, ?, ?, ?, 3, '(Backfilled/No AI)')
+            ON CONFLICT(ticker, revision_date) DO NOTHING
+        """, [(r.ticker, r.name, formatted_date, r.pdf_link, "Unknown", r.title) for r in matched])
+        saved = conn.total_changes - before
+
+        conn.execute("""
+            INSERT INTO tdnet_backfill_days (date, status, pages, matched, saved, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(date) DO UPDATE SET
+                status=excluded.status,
+                pages=excluded.pages,
+                matched=excluded.matched,
+                saved=excluded.saved,
+                updated_at=excluded.updated_at
+        """, (formatted_date, status, pages, len(matched), saved))
+    return len(matched), saved
+
+def backfill_revisions(days_to_backfill=365, workers=BACKFILL_WORKERS, force=False):
+    """
+    Backfills revisions from the TDnet daily listings, newest day first.
+    Days already checkpointed as done/missing are skipped unless force=True.
+    """
     conn = get_db_connection()
     c = conn.cursor()
     
     print(f"Starting backfill for past {days_to_backfill} days...")
-    
-    total_saved = 0
-    consecutive_errors = 0
+    started = time.monotonic()
+    http_client.metrics.reset()
     
     # Start from yesterday (avoid overlapping with today's live polling)
     start_date = datetime.datetime.now() - datetime.timedelta(days=1)
+    days = [start_date - datetime.timedelta(days=i) for i in range(days_to_backfill)]
     
-    for i in range(days_to_backfill):
-        target_date = start_date - datetime.timedelta(days=i)
-        date_str = target_date.strftime('%Y%m%d')
-        formatted_date = target_date.strftime('%Y-%m-%d')
-        url = TDNET_LIST_URL.format(date_str)
-        
-        print(f"[{i+1}/{days_to_backfill}] Fetching {formatted_date}: {url}", end="... ")
-        
-        try:
-            res = requests.get(url, timeout=10)
-            
-            if res.status_code == 404:
-                print("404 Not Found (Data retention limit reached?)")
-                consecutive_errors += 1
-                if consecutive_errors >= 5:
-                    print("Stopping backfill due to multiple consecutive 404s.")
-                    break
-                continue
-            
-            if res.status_code != 200:
-                print(f"HTTP {res.status_code}")
-                continue
-
-            consecutive_errors = 0 # Reset on success
-            
-            # Parse HTML
-            soup = BeautifulSoup(res.content, 'html.parser')
-            rows = soup.find_all('tr')
-            
-            daily_count = 0
+    finished = set() if force else load_finished_days(c)
+    todo = [d for d in days if d.strftime('%Y-%m-%d') not in finished]
+    print(f"{len(days) - len(todo)} days already done (checkpoint), {len(todo)} to fetch.")
+    
+    total_saved = 0
+    consecutive_missing = 0
+    stop = False
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Submit in windows so a run of 404s (retention limit) stops further requests
+        for offset in range(0, len(todo), workers * 2):
+            window = todo[offset:offset + workers * 2]
+            results = pool.map(fetch_day, window)
             
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) < 4:
+            for j, (target_date, (status, pages, rows)) in enumerate(zip(window, results)):
+                formatted_date = target_date.strftime('%Y-%m-%d')
+                if status == 'error':
+                    # Not checkpointed as done: retried on the next run
+                    save_day(conn, formatted_date, status, pages, [])
+                    print(f"[{offset + j + 1}/{len(todo)}] {formatted_date}: error (will retry next run)")
                     continue
                 
-                try:
-                    code_text = cols[1].get_text().strip()
-                    name_text = cols[2].get_text().strip()
-                    title_text = cols[3].get_text().strip()
-                    
-                    # Filter for Revision
-                    if "業績予想の修正" in title_text or "差異" in title_text:
-                        ticker = code_text[:4]
-                        
-                        pdf_link = None
-                        a_tag = cols[3].find('a')
-                        if a_tag:
-                            pdf_link = "https://www.release.tdnet.info/inbs/" + a_tag['href']
-
-                        # Determine rough 'is_upward' from Title for UI fallback
-                        # 3 = Backfilled/Skipped
-                        
-                        c.execute("""
-                            INSERT INTO revisions 
-                            (ticker, company_name, revision_date, source_url, quarter, title, ai_analyzed, ai_summary)
-                            VALUES (?, ?, ?, ?, ?, ?, 3, '(Backfilled/No AI)')
-                            ON CONFLICT(ticker, revision_date) DO NOTHING
-                        """, (
-                            ticker, 
-                            name_text, 
-                            formatted_date,
-                            pdf_link,
-                            "Unknown",
-                            title_text
-                        ))
-                        
-                        if c.rowcount > 0:
-                            daily_count += 1
-                            
-                except Exception:
-                    continue
-            
-            print(f"Saved {daily_count} revisions.")
-            total_saved += daily_count
-            conn.commit()
-            
-            # Be gentle
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error: {e}")
+                matched, saved = save_day(conn, formatted_date, status, pages, rows)
+                total_saved += saved
+                print(f"[{offset + j + 1}/{len(todo)}] {formatted_date}: "
+                      + ("404 Not Found" if status == 'missing' else f"{len(rows)} rows, {matched} matched, saved {saved}"))
+                
+                consecutive_missing = consecutive_missing + 1 if status == 'missing' else 0
+                if consecutive_missing >= MAX_CONSECUTIVE_MISSING:
+                    print("Stopping backfill due to multiple consecutive 404s (data retention limit reached?).")
+                    stop = True
+                    break
+            if stop:
+                break
             
     conn.close()
-    print(f"\nBackfill Completed. Total new records: {total_saved}")
+    print(f"\nBackfill Completed. Total new records: {total_saved} in {time.monotonic() - started:.1f}s")
+    http_client.print_metrics()
 
 if __name__ == "__main__":
     backfill_revisions()
@@ -38,10 +38,91 @@ def init_db():
         domain TEXT,
         is_paid BOOLEAN DEFAULT 0,
         published_at TIMESTAMP,
+        story_id INTEGER,  -- news_stories cluster (near-duplicates across investors)
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (investor_id) REFERENCES investors (id)
     )
     ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_news_items_story ON news_items (story_id)')
+
+    # News Stories (one row per cluster of near-duplicate articles)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS news_stories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        canonical_news_id INTEGER,  -- First stored article of the story
+        title TEXT,
+        signature TEXT,  -- JSON MinHash signature
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (canonical_news_id) REFERENCES news_items (id)
+    )
+    ''')
+
+    # Story <-> Investor (many-to-many)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS story_investors (
+        story_id INTEGER NOT NULL,
+        investor_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (story_id, investor_id),
+        FOREIGN KEY (story_id) REFERENCES news_stories (id) ON DELETE CASCADE,
+        FOREIGN KEY (investor_id) REFERENCES investors (id)
+    )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_story_investors_investor ON story_investors (investor_id)')
+
+    # RSS Feed Cache (conditional GET state per investor query)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS feed_cache (
+        query TEXT PRIMARY KEY,
+        etag TEXT,
+        modified TEXT,
+        guids TEXT,  -- JSON list of entry GUIDs from the last response
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # AI Summary Queue (news items waiting for summarize_news)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS summary_queue (
+        news_id INTEGER PRIMARY KEY,
+        status TEXT DEFAULT 'pending',  -- pending / done / failed
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP,
+        FOREIGN KEY (news_id) REFERENCES news_items (id) ON DELETE CASCADE
+    )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_summary_queue_status ON summary_queue (status, enqueued_at)')
+
+    # Near-duplicate Summary Cache (SimHash split into 4 indexed 16-bit bands)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS summary_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,  -- 'news_llm' (fetch_news) / 'ai_summary' (summarize_news)
+        simhash INTEGER NOT NULL,
+        band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER,
+        summary TEXT NOT NULL,
+        hits INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_hit_at TIMESTAMP
+    )
+    ''')
+    for i in range(4):
+        c.execute(f'CREATE INDEX IF NOT EXISTS idx_summary_cache_band{i} ON summary_cache (kind, band{i})')
+
+    # Shared Gemini quota state (llm_scheduler.py)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS llm_quota_state (
+        model TEXT PRIMARY KEY,
+        rpm_tokens REAL,
+        tpm_tokens REAL,
+        rpd_tokens REAL,
+        updated_at REAL,  -- Unix time of the last refill
+        paused_until REAL DEFAULT 0,  -- Unix time, set after 429
+        strikes INTEGER DEFAULT 0  -- Consecutive 429s (backoff exponent)
+    )
+    ''')
 
     # Daily Stats Table for Access Ranking
     c.execute('''
@@ -0,0 +1,239 @@
+import io
+import csv
+import sys
+import datetime
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from fetch_edinet import API_KEY, get_db_connection
+from xbrl_extract import download_zip
+
+# Holdings index for ownership reports (大量保有報告書 / 変更報告書) saved in edinet_documents.
+# For each document the type=5 package (XBRL converted to CSV) is downloaded into memory,
+# its CSV members are streamed row by row and the holder, issuer, holding ratio and the
+# change versus the previous report are stored in edinet_holdings.
+#
+# CSV layout (UTF-16, tab separated):
+#   要素ID, 項目名, コンテキストID, 相対年度, 連結・個別, 期間・時点, ユニットID, 単位, 値
+
+HOLDINGS_WORKERS = 2 # Matches http_client's EDINET host limit
+MAX_ATTEMPTS = 3
+INGEST_BATCH = 200
+
+# Element local name (after "jplvh_cor:" / "jpdei_cor:") -> field
+ELEMENT_FIELDS = {
+    'NameOfIssuer': 'issuer_name',
+    'SecurityCodeOfIssuer': 'issuer_code',
+    'FilerNameInJapaneseDEI': 'holder_name',
+    'EDINETCodeDEI': 'holder_edinet_code',
+    'HoldingRatioOfShareCertificatesEtc': 'holding_ratio',
+    'HoldingRatioOfShareCertificatesEtcPerLastReport': 'previous_ratio',
+    'TotalNumberOfStocksEtcHeld': 'shares_held',
+    'DateWhenFilingRequirementArose': 'obligation_date',
+}
+
+def package_url(doc_id):
+    return f"https://disclosure.edinet-fsa.go.jp/api/v2/documents/{doc_id}?type=5&Subscription-Key={API_KEY}"
+
+def iter_csv_rows(zip_bytes):
+    """
+    Yields (element_id, context_id, value) from every CSV member, streamed.
+    """
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        for info in zf.infolist():
+            if not info.filename.lower().endswith('.csv'):
+                continue
+            with zf.open(info) as raw:
+                reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-16', newline=''), delimiter='\t')
+                next(reader, None) # Header
+                for row in reader:
+                    if len(row) >= 9:
+                        yield row[0], row[2], row[8]
+
+def parse_ratio(value):
+    """
+    XBRL percentages are fractions ("0.0512" = 5.12%). Returns % or None.
+    """
+    try:
+        return round(float(value) * 100, 2)
+    except (TypeError, ValueError):
+        return None
+
+def extract_holding(rows):
+    """
+    Returns the holdings fields of one report. For joint filings the totals
+    (context with "Total") win over the first holder's own figures.
+    """
+    found = {} # field -> (is_total, value)
+    for element_id, context_id, value in rows:
+        field = ELEMENT_FIELDS.get(element_id.split(':')[-1])
+        if not field or value in ('', '－', '-'):
+            continue
+        is_total = 'Total' in context_id
+        if field not in found or (is_total and not found[field][0]):
+            found[field] = (is_total, value)
+    values = {field: v for field, (_, v) in found.items()}
+
+    holding = {
+        'issuer_ticker': (values.get('issuer_code') or '')[:4] or None,
+        'issuer_name': values.get('issuer_name'),
+        'holder_name': values.get('holder_name'),
+        'holder_edinet_code': values.get('holder_edinet_code'),
+        'holding_ratio': parse_ratio(values.get('holding_ratio')),
+        'previous_ratio': parse_ratio(values.get('previous_ratio')),
+        'shares_held': None,
+        'obligation_date': values.get('obligation_date'),
+    }
+    try:
+        holding['shares_held'] = int(float(values.get('shares_held')))
+    except (TypeError, ValueError):
+        pass
+    if holding['holding_ratio'] is not None and holding['previous_ratio'] is not None:
+        holding['ratio_change'] = round(holding['holding_ratio'] - holding['previous_ratio'], 2)
+    else:
+        holding['ratio_change'] = None
+    return holding
+
+def fetch_holding(doc_id):
+    """
+    Worker: downloads and parses one package. Returns (doc_id, holding or None).
+    """
+    zip_bytes = download_zip(package_url(doc_id))
+    if not zip_bytes:
+        return doc_id, None
+    try:
+        return doc_id, extract_holding(iter_csv_rows(zip_bytes))
+    except (zipfile.BadZipFile, UnicodeError, csv.Error) as e:
+        print(f"  {doc_id}: package parse error: {e}")
+        return doc_id, None
+
+def pending_documents(conn, limit=INGEST_BATCH, doc_ids=None):
+    """
+    Ownership reports without holdings yet (or failed fewer than MAX_ATTEMPTS times), newest first.
+    doc_ids: only those documents (at most INGEST_BATCH ids).
+    """
+    id_filter = ""
+    params = [MAX_ATTEMPTS]
+    if doc_ids is not None:
+        id_filter = f"AND d.id IN ({','.join('?' * len(doc_ids))})"
+        params += list(doc_ids)
+    return conn.execute(f"""
+        SELECT d.id, d.submitter_name, d.investor_id, d.submitted_at
+        FROM edinet_documents d
+        LEFT JOIN edinet_holdings h ON h.doc_id = d.id
+        WHERE (h.doc_id IS NULL OR (h.status = 'error' AND h.attempts < ?)) {id_filter}
+        ORDER BY d.submitted_at DESC
+        LIMIT ?
+    """, params + [limit]).fetchall()
+
+def pending_batches(conn, doc_ids=None):
+    """
+    Yields batches of pending documents: the given doc_ids only, or the whole backlog.
+    """
+    if doc_ids is not None:
+        doc_ids = list(doc_ids)
+        for i in range(0, len(doc_ids), INGEST_BATCH):
+            yield pending_documents(conn, doc_ids=doc_ids[i:i + INGEST_BATCH])
+        return
+    seen = set()
+    while True:
+        # Errors are retried on the next run, not within this one
+        batch = [r for r in pending_documents(conn) if r[0] not in seen]
+        if not batch:
+            return
+        seen |= {r[0] for r in batch}
+        yield batch
+
+def save_holdings(conn, docs, results):
+    """
+    docs: {doc_id: (submitter_name, investor_id, submitted_at)}; results: [(doc_id, holding or None)].
+    One executemany + commit per batch.
+    """
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    for doc_id, h in results:
+        submitter, investor_id, submitted_at = docs[doc_id]
+        h = h or {}
+        rows.append((
+            doc_id, 'done' if h else 'error',
+            h.get('issuer_ticker'), h.get('issuer_name'),
+            h.get('holder_name') or submitter, h.get('holder_edinet_code'), investor_id,
+            h.get('holding_ratio'), h.get('previous_ratio'), h.get('ratio_change'),
+            h.get('shares_held'), h.get('obligation_date'), submitted_at, now,
+        ))
+    conn.executemany("""
+        INSERT INTO edinet_holdings
+        (doc_id, status, attempts, issuer_ticker, issuer_name, holder_name, holder_edinet_code, investor_id,
+         holding_ratio, previous_ratio, ratio_change, shares_held, obligation_date, submitted_at, updated_at)
+        VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(doc_id) DO UPDATE SET
+            status=excluded.status,
+            attempts=edinet_holdings.attempts + 1,
+            issuer_ticker=excluded.issuer_ticker,
+            issuer_name=excluded.issuer_name,
+            holder_name=excluded.holder_name,
+            holder_edinet_code=excluded.holder_edinet_code,
+            investor_id=excluded.investor_id,
+            holding_ratio=excluded.holding_ratio,
+            previous_ratio=excluded.previous_ratio,
+            ratio_change=excluded.ratio_change,
+            shares_held=excluded.shares_held,
+            obligation_date=excluded.obligation_date,
+            submitted_at=excluded.submitted_at,
+            updated_at=excluded.updated_at
+    """, rows)
+    conn.commit()
+    return sum(1 for _, h in results if h)
+
+def ingest_holdings(conn=None, workers=HOLDINGS_WORKERS, max_docs=None, doc_ids=None):
+    """
+    Ingests holdings for pending ownership reports, INGEST_BATCH documents at a time.
+    doc_ids limits it to those documents (run_check: the reports it just saved);
+    the backlog is left to the CLI and backfill_edinet.py.
+    Returns the number of reports stored.
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    stored = 0
+    processed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in pending_batches(conn, doc_ids):
+            if max_docs is not None:
+                batch = batch[:max_docs - processed]
+                if not batch:
+                    break
+            if not batch:
+                continue
+            docs = {r[0]: (r[1], r[2], r[3]) for r in batch}
+            processed += len(docs)
+            results = list(pool.map(fetch_holding, docs))
+            stored += save_holdings(conn, docs, results)
+            print(f"  Holdings: {stored}/{processed} reports parsed.")
+    if own_conn:
+        conn.close()
+    return stored
+
+def holders_of(conn, ticker):
+    """
+    All large-holder reports for a ticker over time (newest first).
+    """
+    return conn.execute("""
+        SELECT obligation_date, holder_name, holding_ratio, previous_ratio, ratio_change, doc_id
+        FROM edinet_holdings
+        WHERE issuer_ticker = ? AND status = 'done'
+        ORDER BY obligation_date DESC
+    """, (ticker,)).fetchall()
+
+def holdings_of_investor(conn, investor_id, since):
+    """
+    A tracked investor's reports since a date (e.g. the start of the quarter).
+    """
+    return conn.execute("""
+        SELECT obligation_date, issuer_ticker, issuer_name, holding_ratio, ratio_change, doc_id
+        FROM edinet_holdings
+        WHERE investor_id = ? AND obligation_date >= ? AND status = 'done'
+        ORDER BY obligation_date DESC
+    """, (investor_id, since)).fetchall()
+
+if __name__ == "__main__":
+    limit = int(sys.argv[sys.argv.index('--limit') + 1]) if '--limit' in sys.argv else None
+    print(f"EDINET holdings ingestion: {ingest_holdings(max_docs=limit)} reports stored.")
@@ -1,5 +1,5 @@
 
-import requests
+import http_client
 from bs4 import BeautifulSoup
 import sqlite3
 import os
@@ -32,13 +32,12 @@ def fetch_kabutan_dividend(ticker):
     # Use the Finance (Kessan) page for more reliable table data
     url = f"https://kabutan.jp/stock/finance?code={ticker}&mode=k"
     headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
     }
     
     try:
-        res = requests.get(url, headers=headers, timeout=10)
+        res = http_client.get(url, headers=headers, cache=True)
         if res.status_code != 200:
             print(f"  Failed to fetch: {res.status_code}")
             return None
@@ -172,8 +171,7 @@ def main():
             
         print(f"[{count+1}/{total}] Fetching {ticker}...")
         
-        data = fetch_kabutan_dividend(ticker)
-        time.sleep(1.0) # Polite sleep
+        data = fetch_kabutan_dividend(ticker) # Paced by http_client (kabutan.jp: 1 req/s)
         
         if data:
             print(f"  -> {data['company_name']} | Div: {data['dividend']} | Set: {data['settlement_month']}")
@@ -234,6 +232,7 @@ def main():
         if count % 10 == 0: conn.commit()
 
     print(f"Finished. Updated {updated} stocks.")
+    http_client.print_metrics()
     conn.close()
 
 if __name__ == "__main__":
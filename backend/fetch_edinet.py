@@ -1,105 +1,141 @@
-import requests
+import http_client
 import datetime
 import sqlite3
 import os
 import time
+from matcher import InvestorMatcher
 
 # --- CONFIG ---
 # Get API Key from Environment or use provided key
 API_KEY = os.environ.get('EDINET_API_KEY', 'f438dea945154ea89f2bcbc8960d7b8e')
 
+INSERT_CHUNK_ROWS = 100 # 7 values per row, under SQLite's default 999 variables
+
+# 120, 130, 140 range imply ownership reports (大量保有報告書 / 変更報告書 / 訂正報告書)
+OWNERSHIP_DOC_PREFIXES = ('120', '130', '140')
+
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
 
 def get_db_connection():
     return sqlite3.connect(DB_PATH)
 
-def get_tracked_investors():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT name, aliases FROM investors")
-    rows = c.fetchall()
-    conn.close()
-    
-    investors = []
-    for r in rows:
-        name = r[0]
-        aliases = r[1].split(',') if r[1] else []
-        # Normalize: Remove spaces, etc
-        targets = [name] + [a.strip() for a in aliases if a.strip()]
-        investors.append({'name': name, 'targets': targets})
-    return investors
+def get_tracked_investors(conn):
+    """
+    Matcher over all investor names/aliases (full/half width, spaces and 株式会社 normalized).
+    """
+    rows = conn.execute("SELECT id, name, aliases FROM investors").fetchall()
+    return InvestorMatcher({'id': r[0], 'name': r[1], 'aliases': r[2]} for r in rows)
 
-def fetch_edinet_list(date_str):
+def fetch_edinet_day(date_str):
+    """
+    Returns (status, docs): status 'done' or 'error' (API key missing, HTTP/API error).
+    """
     if API_KEY == 'YOUR_API_KEY_HERE':
         print("WARNING: API Key not set. Please set EDINET_API_KEY env var or edit script.")
-        return []
+        return 'error', []
 
     url = f"https://disclosure.edinet-fsa.go.jp/api/v2/documents.json?date={date_str}&type=2&Subscription-Key={API_KEY}"
     print(f"Fetching EDINET list for {date_str}...")
     
     try:
-        res = requests.get(url, timeout=30)
+        res = http_client.get(url, timeout=30)
         if res.status_code == 200:
             data = res.json()
-            return data.get('results', [])
+            # API errors (e.g. invalid key) come back as 200 with metadata.status
+            status = str(data.get('metadata', {}).get('status', '200'))
+            if status != '200':
+                print(f"Failed to fetch list: API status {status} {data.get('metadata', {}).get('message', '')}")
+                return 'error', []
+            return 'done', data.get('results') or []
         else:
             print(f"Failed to fetch list: {res.status_code} {res.text}")
-            return []
+            return 'error', []
     except Exception as e:
         print(f"Error fetching list: {e}")
-        return []
+        return 'error', []
 
-def save_document(doc, investor_name):
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    doc_id = doc.get('docID')
-    submitter = doc.get('filerName')
-    subject_code = doc.get('secCode') # Ticker usually
-    desc = doc.get('docDescription')
-    submitted_at = doc.get('submitDateTime')
-    
-    # Check duplicate
-    c.execute("SELECT id FROM edinet_documents WHERE id = ?", (doc_id,))
-    if c.fetchone():
-        conn.close()
-        return False
+def fetch_edinet_list(date_str):
+    return fetch_edinet_day(date_str)[1]
 
-    print(f"  [MATCH] Saving: {submitter} -> {desc}")
-    
+def select_ownership_reports(docs, investors):
+    """
+    Keeps the 120/130/140 docTypeCode ranges (ownership reports) and matches their filers.
+    Returns [(doc, investor or None)].
+    """
+    matches = []
+    for doc in docs:
+        # Handle None (null in JSON) by converting to empty string
+        if not str(doc.get('docTypeCode') or '').startswith(OWNERSHIP_DOC_PREFIXES):
+            continue
+        filer = doc.get('filerName', '')
+        if not filer:
+            continue
+        # Identify Investor (Optional)
+        matches.append((doc, investors.match(filer)))
+    return matches
+
+def document_row(doc, investor):
+    doc_id = doc.get('docID')
     pdf_link = f"https://disclosure.edinet-fsa.go.jp/api/v2/documents/{doc_id}?type=2&Subscription-Key={API_KEY}"
+    return (doc_id, doc.get('filerName'), doc.get('secCode'), doc.get('docDescription'),
+            doc.get('submitDateTime'), pdf_link, investor['id'] if investor else None)
+
+def insert_documents(conn, rows):
+    """
+    Multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING id, chunked under the
+    SQLite variable limit. Returns the ids that were actually inserted.
+    """
+    inserted = set()
+    for i in range(0, len(rows), INSERT_CHUNK_ROWS):
+        chunk = rows[i:i + INSERT_CHUNK_ROWS]
+        values = ",".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(chunk))
+        cur = conn.execute(f"""
+            INSERT INTO edinet_documents (id, submitter_name, subject_edinet_code, doc_description, submitted_at, pdf_link, investor_id)
+            VALUES {values}
+            ON CONFLICT(id) DO NOTHING
+            RETURNING id
+        """, [v for row in chunk for v in row])
+        inserted |= {r[0] for r in cur.fetchall()}
+    return inserted
+
+def save_documents(conn, matches, post=True):
+    """
+    matches: [(doc, matched investor or None)] for one date.
+    Inserts them with one batched upsert and one commit; documents already stored
+    (EDINET lists older documents again when their status changes) are skipped.
+    Then posts the tracked investors' new reports to X (unless post=False, e.g. backfill).
+    Returns the docIDs of the new documents.
+    """
+    rows = {}
+    for doc, investor in matches:
+        doc_id = doc.get('docID')
+        if doc_id and doc_id not in rows:
+            rows[doc_id] = (document_row(doc, investor), investor)
+    if not rows:
+        return []
     
-    # Calculate investor_id
-    investor_id = None
-    if investor_name:
-        c.execute("SELECT id FROM investors WHERE name = ? LIMIT 1", (investor_name,))
-        row = c.fetchone()
-        if row:
-            investor_id = row[0]
-
-    c.execute("""
-        INSERT INTO edinet_documents (id, submitter_name, subject_edinet_code, doc_description, submitted_at, pdf_link, investor_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (doc_id, submitter, subject_code, desc, submitted_at, pdf_link, investor_id))
-    
+    inserted = insert_documents(conn, [row for row, _ in rows.values()])
     conn.commit()
-    conn.close()
+    new = [rows[doc_id] for doc_id in rows if doc_id in inserted]
+    
+    for (doc_id, submitter, _, desc, _, pdf_link, _), investor in new:
+        print(f"  [MATCH] Saved: {submitter} -> {desc}")
+        
+        # --- Post to X (Twitter) if it is a tracked investor ---
+        if investor and post:
+            try:
+                from send_x import post_to_x
+                
+                # Format: "🚨 Big News! [Investor] submitted [Report] for [Code]"
+                # subject_code might be just code "12340".
+                
+                x_msg = f"🚨 【大量保有・変更報告】\n\n著名投資家: {investor['name']}\n提出者: {submitter}\n\n{desc}\n\n📄 {pdf_link}\n#著名投資家 #大量保有報告書 #日本株 #投資家さんと繋がりたい #イナゴ #株"
+                post_to_x(x_msg)
+                print(f"    -> Posted to X: {submitter} - {desc}")
+            except Exception as e:
+                print(f"    [X Post Failed] {e}")
 
-    # --- Post to X (Twitter) if it is a tracked investor ---
-    if investor_id:
-        try:
-            from send_x import post_to_x
-            
-            # Format: "🚨 Big News! [Investor] submitted [Report] for [Code]"
-            # subject_code might be just code "12340".
-            
-            x_msg = f"🚨 【大量保有・変更報告】\n\n著名投資家: {investor_name}\n提出者: {submitter}\n\n{desc}\n\n📄 {pdf_link}\n#著名投資家 #大量保有報告書 #日本株 #投資家さんと繋がりたい #イナゴ #株"
-            post_to_x(x_msg)
-            print(f"    -> Posted to X: {submitter} - {desc}")
-        except Exception as e:
-            print(f"    [X Post Failed] {e}")
-
-    return True
+    return [row[0] for row, _ in new]
 
 def run_check():
     import sys
@@ -124,10 +160,11 @@ def run_check():
         datetime.date.today() - datetime.timedelta(days=1)
     ]
     
-    investors = get_tracked_investors()
+    conn = get_db_connection()
+    investors = get_tracked_investors(conn)
     print(f"Tracking {len(investors)} investors for matching purposes (Capturing ALL reports)...")
     
-    total_saved = 0
+    saved_ids = []
     
     for d in dates_to_check:
         d_str = d.strftime('%Y-%m-%d')
@@ -137,43 +174,19 @@ def run_check():
         if len(docs) > 0:
              print(f"  [DEBUG] First Doc Keys: {list(docs[0].keys())}")
         
-        # Filter Logic
-        saved_count = 0
-        # skipped_debug = 0
+        # Filter Logic (All 120/130/140 reports; the matched investor can be None)
+        matches = select_ownership_reports(docs, investors)
         
-        for doc in docs:
-            # Handle None (null in JSON) by converting to empty string
-            doc_code = str(doc.get('docTypeCode') or '')
-            
-            # 120, 130, 140 range imply ownership reports
-            if not (doc_code.startswith('120') or doc_code.startswith('130') or doc_code.startswith('140')):
-                # if skipped_debug < 10:
-                #     print(f"    [SKIP] Code: {doc_code}, Desc: {doc.get('docDescription')}")
-                #     skipped_debug += 1
-                continue
-                
-            filer = doc.get('filerName', '')
-            if not filer: continue
-            filer = filer.replace('　', ' ').strip() # Normalize space
-            
-            # Identify Investor (Optional)
-            matched_investor = None
-            for inv in investors:
-                for target in inv['targets']:
-                    clean_filer = filer.replace(' ', '')
-                    clean_target = target.replace(' ', '')
-                    if clean_target in clean_filer:
-                        matched_investor = inv['name']
-                        break
-                if matched_investor:
-                    break
-            
-            # Save Document (All 120/130/140 reports)
-            # Pass matched_investor (can be None)
-            saved = save_document(doc, matched_investor)
-            if saved: total_saved += 1
-
-    print(f"EDINET Check Complete. Saved {total_saved} new reports.")
+        saved_ids += save_documents(conn, matches)
+
+    print(f"EDINET Check Complete. Saved {len(saved_ids)} new reports.")
+    
+    # Structured holdings (holder, issuer, ratio) for the new reports only;
+    # older pending reports are left to edinet_holdings.py / backfill_edinet.py
+    if saved_ids:
+        from edinet_holdings import ingest_holdings
+        ingest_holdings(conn, doc_ids=saved_ids)
+    conn.close()
 
 if __name__ == "__main__":
     run_check()
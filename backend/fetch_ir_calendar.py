@@ -1,4 +1,4 @@
-import requests
+import http_client
 from bs4 import BeautifulSoup
 import datetime
 import time
@@ -6,6 +6,7 @@ import sqlite3
 import os
 import re
 import pandas as pd
+import numpy as np
 import io
 
 # Database path
@@ -23,10 +24,9 @@ def fetch_jpx_data():
     page_url = "https://www.jpx.co.jp/listing/event-schedules/financial-announcement/index.html"
     
     print(f"Fetching JPX Page: {page_url}")
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
     
     try:
-        res = requests.get(page_url, headers=headers)
+        res = http_client.get(page_url)
         if res.status_code != 200:
             print(f"Failed to fetch JPX page: {res.status_code}")
             return
@@ -43,108 +43,15 @@ def fetch_jpx_data():
             file_url = base_url + link.get('href')
             print(f"Downloading [{i+1}/{len(links)}]: {file_url}")
             
-            f_res = requests.get(file_url, headers=headers)
+            # JPX pacing (1 request / 2s) is handled by http_client
+            f_res = http_client.get(file_url, timeout=60)
             if f_res.status_code != 200:
                 print("  Failed download.")
                 continue
-
-            # Sleep to respect JPX server
-            time.sleep(2)
                 
             try:
-                # Read with pandas
-                # Note: The header row seems to be row 0 (or implicit). 
-                # Debugging showed Col 0 = Date, Col 1 = Ticker, Col 2 = Name
-                # We interpret without header initially to be safe or inspect first row.
-                # Actually, pandas likely picks up the first row as columns.
-                # Let's read with header=0 (default)
                 df = pd.read_excel(io.BytesIO(f_res.content))
-                
-                # Convert to string and handle formatting
-                events = []
-                
-                # Debug: Print first 5 rows raw content
-                print("DEBUG: Showing first 3 rows of Excel data:")
-                print(df.head(3).to_string())
-                print("------------------------------------------")
-                
-                # Iterate rows
-                for index, row in df.iterrows():
-                    # Check if Row is valid data
-                    # Required: Date in Col 0, Ticker in Col 1
-                    try:
-                        # Access by index position (safer than name)
-                        # iloc[row_idx, col_idx]
-                        # row is a Series, so row.iloc[0]
-                        
-                        raw_date = row.iloc[0]
-                        raw_ticker = row.iloc[1]
-                        raw_name = row.iloc[2]
-                        
-                        # Validate Ticker (must be 4 digits or new code like 130A)
-                        ticker_str = str(raw_ticker).strip()
-                        # Allow 4 digits OR 4-5 chars with letters (e.g. 130A, 25935 etc if preferred shares, but mainly new IPOs)
-                        # JPX new codes are 3 digits + 1 char usually.
-                        if not re.match(r'^[0-9A-Z]{4,5}$', ticker_str):
-                            continue
-
-                        # Debug: Print the first valid row found to check columns
-                        # Removed debug print block
-                            
-                        # Validate Date
-                        # Pandas usually parses dates as Timestamp
-                        target_date = None
-                        if isinstance(raw_date, datetime.datetime):
-                            target_date = raw_date.date()
-                        else:
-                            # Try parsing string
-                            try:
-                                target_date = pd.to_datetime(raw_date).date()
-                            except:
-                                continue
-                        
-                        if not target_date: continue
-                        
-                        
-                        name = str(raw_name).strip()
-
-                        # Filter out Investment Corporations / REITs
-                        if '投資法人' in name:
-                            continue
-                        
-                        # Try to get Title/Type from Col 7 (Index 7)
-                        # JPX format (observed): Date, Ticker, Name, EnglishName, ?, ?, ?, QuarterInfo, ...
-                        raw_title = ""
-                        if len(row) > 7:
-                            raw_title = str(row.iloc[7]).strip()
-                        
-                        # Determine Type
-                        event_type = '決算' # Default
-                        desc = f"{name} ({ticker_str}) 決算発表予定"
-                        
-                        if raw_title:
-                            desc = f"{name} ({ticker_str}) {raw_title}"
-                            if '第１' in raw_title or '第1' in raw_title or '1Q' in raw_title:
-                                event_type = '1Q'
-                            elif '第２' in raw_title or '第2' in raw_title or '2Q' in raw_title or '中間' in raw_title:
-                                event_type = '2Q'
-                            elif '第３' in raw_title or '第3' in raw_title or '3Q' in raw_title:
-                                event_type = '3Q'
-                            elif '本決算' in raw_title or '通期' in raw_title or '決算短信' in raw_title:
-                                event_type = '4Q'
-
-                        events.append({
-                            'ticker': ticker_str,
-                            'name': name,
-                            'date': target_date.strftime('%Y-%m-%d'),
-                            'type': event_type,
-                            'desc': desc
-                        })
-                        
-                    except Exception as e:
-                        # Skip row parsing error
-                        continue
-                
+                events = parse_jpx_frame(df)
                 print(f"  Parsed {len(events)} events.")
                 updated, new = save_events(events)
                 total_events_saved += new
@@ -158,41 +65,83 @@ def fetch_jpx_data():
     except Exception as e:
         print(f"Error in fetch_jpx_data: {e}")
 
+# JPX format (observed): Date, Ticker, Name, EnglishName, ?, ?, ?, QuarterInfo, ...
+# Column positions are used (header texts vary between files)
+JPX_TICKER_RE = r'[0-9A-Z]{4,5}' # 4 digits or new codes like 130A
+JPX_QUARTER_TYPES = [
+    ('1Q', r'第１|第1|1Q'),
+    ('2Q', r'第２|第2|2Q|中間'),
+    ('3Q', r'第３|第3|3Q'),
+    ('4Q', r'本決算|通期|決算短信'),
+]
+
+def parse_jpx_frame(df):
+    """
+    Column-wise parse of one JPX calendar sheet.
+    Returns records (ticker, name, date 'YYYY-MM-DD', event_type, description) ready for save_events.
+    """
+    if df.shape[1] < 3:
+        return []
+
+    # Tickers read as numbers come back as floats ("1301.0") when the column has blanks
+    tickers = df.iloc[:, 1].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    dates = pd.to_datetime(df.iloc[:, 0], errors='coerce', format='mixed')
+    names = df.iloc[:, 2].astype(str).str.strip()
+    titles = df.iloc[:, 7].fillna('').astype(str).str.strip() if df.shape[1] > 7 else pd.Series('', index=df.index)
+
+    # Valid rows only, excluding Investment Corporations / REITs
+    valid = tickers.str.fullmatch(JPX_TICKER_RE) & dates.notna() & ~names.str.contains('投資法人', regex=False)
+    tickers, dates, names, titles = tickers[valid], dates[valid], names[valid], titles[valid]
+
+    event_types = np.select(
+        [titles.str.contains(pattern, regex=True) for _, pattern in JPX_QUARTER_TYPES],
+        [event_type for event_type, _ in JPX_QUARTER_TYPES],
+        default='決算',
+    )
+    label = names + ' (' + tickers + ') '
+    descriptions = np.where(titles != '', label + titles, label + '決算発表予定')
+
+    return list(zip(tickers, names, dates.dt.strftime('%Y-%m-%d'), event_types.tolist(), descriptions.tolist()))
+
 def save_events(events):
+    """
+    events: records from parse_jpx_frame. Existing (ticker, date) rows are updated, others inserted,
+    with one lookup and one executemany each. Returns (updated, new).
+    """
     if not events: return 0, 0
     conn = get_db_connection()
     c = conn.cursor()
     
-    new_count = 0
-    update_count = 0
+    dates = [e[2] for e in events]
+    existing = set(c.execute(
+        "SELECT ticker, event_date FROM ir_events WHERE event_date BETWEEN ? AND ?",
+        (min(dates), max(dates))).fetchall())
     
-    for e in events:
-        try:
-            # Check duplicate (ticker, date)
-            c.execute("SELECT id, event_type FROM ir_events WHERE ticker = ? AND event_date = ?", (e['ticker'], e['date']))
-            row = c.fetchone()
-            
-            if not row:
-                c.execute("""
-                    INSERT INTO ir_events (ticker, company_name, event_date, event_type, description)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (e['ticker'], e['name'], e['date'], e['type'], e['desc']))
-                new_count += 1
-            else:
-                # Update existing record
-                c.execute("""
-                    UPDATE ir_events 
-                    SET event_type = ?, description = ?, company_name = ?
-                    WHERE ticker = ? AND event_date = ?
-                """, (e['type'], e['desc'], e['name'], e['ticker'], e['date']))
-                update_count += 1
-
-        except Exception as ex:
-            print(f"Error saving row {e}: {ex}")
+    inserts = []
+    updates = []
+    seen = set()
+    for ticker, name, date, event_type, desc in events:
+        key = (ticker, date)
+        if key in existing or key in seen:
+            updates.append((event_type, desc, name, ticker, date))
+        else:
+            inserts.append((ticker, name, date, event_type, desc))
+            seen.add(key)
+    
+    c.executemany("""
+        INSERT INTO ir_events (ticker, company_name, event_date, event_type, description)
+        VALUES (?, ?, ?, ?, ?)
+    """, inserts)
+    # Update existing records
+    c.executemany("""
+        UPDATE ir_events 
+        SET event_type = ?, description = ?, company_name = ?
+        WHERE ticker = ? AND event_date = ?
+    """, updates)
             
     conn.commit()
     conn.close()
-    return update_count, new_count
+    return len(updates), len(inserts)
 
 def run_fetch(days_back=0, days_forward=180):
     """
@@ -4,7 +4,7 @@ import pandas as pd
 import os
 import time
 import datetime
-import requests
+import http_client
 import re
 from bs4 import BeautifulSoup
 from database import get_db_connection
@@ -37,11 +37,9 @@ def fetch_listing_years():
                 # Yahoo Finance JP Scraping.
                 # URL: https://finance.yahoo.co.jp/quote/{ticker}.T/profile
                 url = f"https://finance.yahoo.co.jp/quote/{ticker}.T/profile"
-                headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-                
                 year = None
                 try:
-                    res = requests.get(url, headers=headers, timeout=5)
+                    res = http_client.get(url, timeout=5)
                     if res.status_code == 200:
                         soup = BeautifulSoup(res.content, 'html.parser')
                         # Look for "上場年月日"
@@ -66,15 +64,14 @@ def fetch_listing_years():
                 
             except Exception as e:
                 print(f"  Error {ticker}: {e}")
-            
-            # Be nice to API
-            time.sleep(1.0) 
+            # Pacing (1 req/s) is handled by http_client
             
         conn.commit()
         print("  Batch committed.")
 
     conn.close()
     print("Listing year update complete.")
+    http_client.print_metrics()
 
 if __name__ == "__main__":
     fetch_listing_years()
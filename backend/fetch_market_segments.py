@@ -1,4 +1,4 @@
-import requests
+import http_client
 from bs4 import BeautifulSoup
 import pandas as pd
 import sqlite3
@@ -17,7 +17,7 @@ def fetch_and_update_markets():
     
     try:
         # 1. Scrape page to find the Excel link
-        res = requests.get(JPX_URL, headers={'User-Agent': 'Mozilla/5.0'})
+        res = http_client.get(JPX_URL)
         if res.status_code != 200:
             print("Failed to access JPX page.")
             return
@@ -35,7 +35,7 @@ def fetch_and_update_markets():
         print(f"Downloading Excel: {xls_url}")
 
         # 2. Download Excel
-        xls_res = requests.get(xls_url, headers={'User-Agent': 'Mozilla/5.0'})
+        xls_res = http_client.get(xls_url, timeout=60)
         if xls_res.status_code != 200:
             print("Failed to download Excel.")
             return
@@ -4,10 +4,28 @@ import datetime
 import os
 import json
 import time
+import re
+import codecs
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from database import get_db_connection
+import http_client
+from matcher import DomainMatcher, InvestorMatcher, load_keywords, parse_aliases
+from summary_cache import SummaryCache
+import story_cluster
+from story_cluster import StoryIndex
 
-# Known paid domains or rigorous paywalls
-PAID_DOMAINS = [
+# Concurrency settings for run_fetch
+# Per-host pacing (Google News: 1 request per 2s, article sites: 2 parallel / 1 req/s)
+# is applied by http_client.HOST_LIMITS
+FEED_WORKERS = 2
+ARTICLE_WORKERS = 8
+
+# Reuse LLM summaries across syndicated copies of the same story
+LLM_SUMMARY_CACHE = SummaryCache('news_llm')
+
+# Known paid domains or rigorous paywalls (overridable via keywords.json "paid_domains")
+PAID_DOMAINS = load_keywords("paid_domains", [
     "nikkei.com",
     "bloomberg.co.jp",
     "shikiho.toyokeizai.net",
@@ -16,15 +34,21 @@ PAID_DOMAINS = [
     "asahi.com",
     "mainichi.jp",
     "yomiuri.co.jp"
-]
+])
+PAID_DOMAIN_MATCHER = DomainMatcher(PAID_DOMAINS)
 
 def is_paid_domain(url):
-    for domain in PAID_DOMAINS:
-        if domain in url:
-            return True
-    return False
+    return PAID_DOMAIN_MATCHER.match(url) is not None
 
-def fetch_rss(query):
+def fetch_rss(query, cache=None):
+    """
+    Fetches the Google News RSS for a query.
+    cache: previous feed_cache row ({etag, modified, guids}) used for a conditional GET.
+    Returns (new_entries, cache_update). new_entries only contains entries whose GUID
+    was not in the last response; cache_update is None when nothing changed.
+    """
+    cache = cache or {}
+    
     # Enforce investment related keywords to avoid noise
     # Query format: (Name OR Alias) AND (株 OR 投資 OR 銘柄 OR 資産 OR トレード)
     base_query = f"({query}) AND (株 OR 投資 OR 銘柄 OR 資産 OR トレード)"
@@ -32,31 +56,234 @@ def fetch_rss(query):
     
     encoded_query = requests.utils.quote(base_query)
     url = f"https://news.google.com/rss/search?q={encoded_query}&hl=ja&gl=JP&ceid=JP:ja"
-    feed = feedparser.parse(url)
-    return feed.entries
+    headers = {}
+    if cache.get('etag'):
+        headers['If-None-Match'] = cache['etag']
+    if cache.get('modified'):
+        headers['If-Modified-Since'] = cache['modified']
+    
+    res = http_client.get(url, headers=headers)
+    
+    # 304 Not Modified: nothing to parse
+    if res.status_code == 304:
+        print(f"  [CACHE] Not modified: {query}")
+        return [], None
+    if res.status_code != 200:
+        print(f"  RSS fetch failed: {res.status_code}")
+        return [], None
+    
+    feed = feedparser.parse(res.content)
+    
+    prev_guids = set(cache.get('guids') or [])
+    guids = [entry.get('id') or entry.link for entry in feed.entries]
+    
+    cache_update = {
+        'etag': res.headers.get('ETag'),
+        'modified': res.headers.get('Last-Modified'),
+        'guids': guids
+    }
+    
+    # Same entries as last time (server ignored the validators)
+    if prev_guids and set(guids) <= prev_guids:
+        print(f"  [CACHE] No new entries: {query}")
+        return [], cache_update
+    
+    new_entries = [e for e, g in zip(feed.entries, guids) if g not in prev_guids]
+    return new_entries, cache_update
+
+def load_feed_cache(c):
+    """
+    Returns { query: {etag, modified, guids} } from the feed_cache table.
+    """
+    cache = {}
+    for row in c.execute('SELECT query, etag, modified, guids FROM feed_cache').fetchall():
+        cache[row['query']] = {
+            'etag': row['etag'],
+            'modified': row['modified'],
+            'guids': json.loads(row['guids']) if row['guids'] else []
+        }
+    return cache
+
+def drop_failed_guids(cache_update, failed_guids):
+    """
+    Removes GUIDs of entries that were not stored (extraction failed) from a cache_update,
+    so the next cycle treats them as new again. The validators are dropped too: a 304
+    would otherwise hide the entries until the feed changes.
+    """
+    guids = [g for g in cache_update['guids'] if g not in failed_guids]
+    if len(guids) == len(cache_update['guids']):
+        return cache_update
+    return {'etag': None, 'modified': None, 'guids': guids}
+
+def save_feed_cache(conn, updates):
+    """
+    updates: { query: {etag, modified, guids} }
+    """
+    if not updates:
+        return
+    with conn:
+        conn.executemany('''
+            INSERT INTO feed_cache (query, etag, modified, guids, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(query) DO UPDATE SET
+                etag=excluded.etag,
+                modified=excluded.modified,
+                guids=excluded.guids,
+                updated_at=excluded.updated_at
+        ''', [(q, u['etag'], u['modified'], json.dumps(u['guids'], ensure_ascii=False)) for q, u in updates.items()])
 
 import requests
 from bs4 import BeautifulSoup
 
+# Article extraction limits
+MAX_CONTENT_CHARS = 2000 # Limit length for LLM processing
+MAX_DOWNLOAD_BYTES = 512 * 1024 # Stop reading large portal pages early
+MIN_PARAGRAPH_CHARS = 20
+CHUNK_SIZE = 16 * 1024
+
+try:
+    from lxml import etree as lxml_etree # Fast path (C parser)
+except ImportError:
+    lxml_etree = None
+
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_\-]+)', re.I)
+
+class _StdlibParagraphParser(HTMLParser):
+    """
+    Fallback incremental <p> collector based on the stdlib html.parser.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.in_p = False
+        self.buffer = []
+        self.paragraphs = []
+
+    def _flush(self):
+        if self.in_p:
+            self.paragraphs.append("".join(self.buffer))
+        self.in_p = False
+        self.buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'p':
+            self._flush() # Unclosed <p> is closed by the next one
+            self.in_p = True
+
+    def handle_endtag(self, tag):
+        if tag == 'p':
+            self._flush()
+
+    def handle_data(self, data):
+        if self.in_p:
+            self.buffer.append(data)
+
+class ParagraphCollector:
+    """
+    Feeds raw HTML bytes chunk by chunk and collects <p> text.
+    Uses lxml's pull parser when installed, html.parser otherwise.
+    """
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+        self.paragraphs = []
+        self.length = 0
+        self.decoder = None
+        self.pending = b""
+        if lxml_etree is not None:
+            self.parser = lxml_etree.HTMLPullParser(events=('end',), tag='p', encoding=encoding)
+        else:
+            self.parser = _StdlibParagraphParser()
+
+    def _add(self, text):
+        if len(text) > MIN_PARAGRAPH_CHARS:
+            self.paragraphs.append(text)
+            self.length += len(text) + 1
+
+    def _drain(self):
+        if lxml_etree is not None:
+            for _, el in self.parser.read_events():
+                self._add("".join(el.itertext()))
+        else:
+            for text in self.parser.paragraphs:
+                self._add(text)
+            self.parser.paragraphs = []
+
+    def feed(self, chunk, final=False):
+        if lxml_etree is not None:
+            self.parser.feed(chunk)
+            self._drain()
+            return
+        
+        if self.decoder is None:
+            # Buffer the head so <meta charset> can be sniffed
+            self.pending += chunk
+            if len(self.pending) < 2048 and not final:
+                return
+            chunk, self.pending = self.pending, b""
+            
+            # Header charset, then <meta charset>, then UTF-8
+            encoding = self.encoding
+            if not encoding:
+                m = META_CHARSET_RE.search(chunk)
+                encoding = m.group(1).decode('ascii') if m else 'utf-8'
+            try:
+                self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            except LookupError:
+                self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.parser.feed(self.decoder.decode(chunk, final))
+        self._drain()
+
+    def close(self):
+        """
+        Flushes buffered input and any paragraph left open at the cut-off point.
+        """
+        if lxml_etree is not None:
+            try:
+                self.parser.close()
+            except Exception:
+                pass
+            self._drain()
+            return
+        self.feed(b"", final=True)
+        self.parser._flush()
+        self._drain()
+
+    def is_full(self):
+        return self.length >= MAX_CONTENT_CHARS
+
+    def text(self):
+        return "\n".join(self.paragraphs)[:MAX_CONTENT_CHARS]
+
 def extract_content(url):
     """
     Attempt to extract main text from a free article.
+    Streams the body and stops once MAX_CONTENT_CHARS of paragraph text
+    or MAX_DOWNLOAD_BYTES have been read. Non-HTML responses are skipped.
     Returns truncated text.
     """
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code != 200:
-            return None
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Simple heuristic to find main content (p tags)
-        # This differs vastly by site, but is a starting point
-        paragraphs = soup.find_all('p')
-        text = "\n".join([p.get_text() for p in paragraphs if len(p.get_text()) > 20])
+        with http_client.get(url, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            
+            content_type = response.headers.get('Content-Type', '').lower()
+            if content_type and 'html' not in content_type:
+                return None
+            
+            # requests guesses ISO-8859-1 for text/* without charset; only trust an explicit one
+            encoding = response.encoding if 'charset=' in content_type else None
+            
+            # Simple heuristic to find main content (p tags)
+            # This differs vastly by site, but is a starting point
+            collector = ParagraphCollector(encoding)
+            read_bytes = 0
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                collector.feed(chunk)
+                read_bytes += len(chunk)
+                if collector.is_full() or read_bytes >= MAX_DOWNLOAD_BYTES:
+                    break
+            collector.close()
         
-        return text[:2000] # Limit length for LLM processing
+        return collector.text()
     except Exception as e:
         print(f"Error extracting content from {url}: {e}")
         return None
@@ -71,6 +298,10 @@ def summarize_with_llm(title, content, is_paid):
     # Check for API key
     api_key = os.getenv("OPENAI_API_KEY")
     if api_key:
+        cached = LLM_SUMMARY_CACHE.lookup(title, content)
+        if cached:
+            return cached
+        
         try:
             from openai import OpenAI
             client = OpenAI(api_key=api_key)
@@ -91,7 +322,9 @@ def summarize_with_llm(title, content, is_paid):
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=200
             )
-            return response.choices[0].message.content
+            summary = response.choices[0].message.content
+            LLM_SUMMARY_CACHE.store(title, content, summary)
+            return summary
         except Exception as e:
             print(f"LLM Error: {e}")
             pass
@@ -107,70 +340,237 @@ def summarize_with_llm(title, content, is_paid):
     clean_snippet = clean_snippet[:120].replace('\n', ' ').strip()
     return f"{prefix}{clean_snippet}..."
 
-def run_fetch():
+def build_investor_query(inv):
+    name = inv['name']
+    aliases = parse_aliases(inv['aliases'])
+    
+    queries = [name] + aliases
+    return " OR ".join(queries)
+
+def fetch_investor_feed(inv, cache=None):
+    """
+    Worker: builds the query for one investor and fetches its new RSS entries.
+    Returns (query, entries, cache_update).
+    """
+    full_query = build_investor_query(inv)
+    print(f"Fetching for {inv['name']} ({full_query})...")
+    
+    entries, cache_update = fetch_rss(full_query, cache)
+    return full_query, entries, cache_update
+
+def process_entry(inv_id, entry, story_id=None):
+    """
+    Worker: extracts content and summarizes one RSS entry.
+    Returns the row tuple for news_items (DB writes stay on the main thread).
+    """
+    title = entry.title
+    link = entry.link
+    published = entry.published
+    
+    is_paid = is_paid_domain(link)
+    domain = link.split('/')[2]
+    
+    content_snippet = entry.description
+    if not is_paid:
+        extracted = extract_content(link)
+        if extracted:
+            content_snippet = extracted
+    
+    # Sanitize HTML from content/snippet
+    soup = BeautifulSoup(content_snippet, "html.parser")
+    clean_content = soup.get_text(separator=" ", strip=True)
+    
+    summary = summarize_with_llm(title, clean_content, is_paid)
+    
+    # Parse date
+    try:
+        # published is like 'Wed, 07 Jan 2026 12:00:00 GMT'
+        pub_date = datetime.datetime.strptime(published, '%a, %d %b %Y %H:%M:%S %Z')
+    except:
+        pub_date = datetime.datetime.now()
+    
+    return (inv_id, title, link, summary, domain, is_paid, pub_date, story_id)
+
+SQLITE_MAX_PARAMS = 900 # Stay under SQLite's default variable limit
+
+def load_known_urls(c, urls):
+    """
+    Returns { url: story_id } for urls already stored in news_items, using chunked IN (...) queries
+    instead of one SELECT per entry.
+    """
+    urls = list(urls)
+    known = {}
+    for i in range(0, len(urls), SQLITE_MAX_PARAMS):
+        chunk = urls[i:i+SQLITE_MAX_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        rows = c.execute(f'SELECT url, story_id FROM news_items WHERE url IN ({placeholders})', chunk).fetchall()
+        known.update((r[0], r[1]) for r in rows)
+    return known
+
+def save_news_items(conn, rows):
+    """
+    Writes one investor's new articles with a single executemany + commit,
+    and makes each article the canonical item of its story.
+    """
+    if not rows:
+        return 0
+    with conn:
+        conn.executemany('''
+            INSERT OR IGNORE INTO news_items (investor_id, title, url, summary, domain, is_paid, published_at, story_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        story_cluster.set_canonical_items(conn, [(row[7], row[2]) for row in rows if row[7]])
+    return len(rows)
+
+def cluster_entries(conn, index, inv_id, entries, link_stories, investor_matcher=None):
+    """
+    Assigns each new entry to a story (main thread).
+    Returns (leaders, duplicates): leaders are (entry, story_id) pairs that need extraction;
+    near-duplicates of known stories only produce a (story_id, investor_id) link.
+    New stories are also linked to every other tracked investor named in the title.
+    """
+    leaders = []
+    links = []
+    duplicates = 0
+    with conn:
+        for entry in entries:
+            if link_stories.get(entry.link):
+                links.append((link_stories[entry.link], inv_id))
+                duplicates += 1
+                continue
+            
+            sig = story_cluster.minhash_signature(entry.title)
+            story_id = index.find(sig) if sig else None
+            if story_id:
+                print(f"  Duplicate story: {entry.title}")
+                link_stories[entry.link] = story_id
+                links.append((story_id, inv_id))
+                duplicates += 1
+                continue
+            
+            story_id = story_cluster.create_story(conn, entry.title, sig) if sig else None
+            if story_id:
+                index.add(story_id, sig)
+                link_stories[entry.link] = story_id
+                links.append((story_id, inv_id))
+                if investor_matcher:
+                    links.extend((story_id, inv['id']) for inv in investor_matcher.find_all(entry.title)
+                                 if inv['id'] != inv_id)
+            leaders.append((entry, story_id))
+        story_cluster.link_investors(conn, links)
+    return leaders, duplicates
+
+def run_fetch(feed_workers=FEED_WORKERS, article_workers=ARTICLE_WORKERS):
+    """
+    Concurrent fetch:
+    - RSS queries run in a small pool, paced per host by http_client, as conditional GETs (feed_cache)
+    - Known URLs are filtered per feed with one IN (...) query before any extraction
+    - Near-duplicate articles across investors are clustered into stories (MinHash LSH);
+      only the first article of a story is extracted, the others just link their investor
+    - Article extraction + summarization run in a larger pool, limited per domain
+    - SQLite writes happen only on this thread, one transaction per investor
+    """
+    started = time.monotonic()
+    http_client.metrics.reset()
     conn = get_db_connection()
     c = conn.cursor()
     
     # Get Investors
     investors = c.execute('SELECT * FROM investors').fetchall()
+    investor_matcher = InvestorMatcher(investors)
     
-    for inv in investors:
-        inv_id = inv['id']
-        name = inv['name']
-        aliases = json.loads(inv['aliases'])
-        
-        queries = [name] + aliases
-        full_query = " OR ".join(queries)
-        print(f"Fetching for {name} ({full_query})...")
+    feed_cache = load_feed_cache(c)
+    cache_updates = {}
+    
+    index = StoryIndex(conn)
+    link_stories = {} # url -> story_id for articles seen in this cycle
+    entry_guids = {} # url -> [(query, guid)] for feed_cache
+    failed_links = set() # urls whose article could not be stored this cycle
+    failed_stories = set() # stories created this cycle whose leader could not be stored
+    new_count = 0
+    linked_count = 0
+    
+    with ThreadPoolExecutor(max_workers=feed_workers) as feed_pool, \
+         ThreadPoolExecutor(max_workers=article_workers) as article_pool:
         
-        entries = fetch_rss(full_query)
+        feed_futures = {
+            feed_pool.submit(fetch_investor_feed, inv, feed_cache.get(build_investor_query(inv))): inv
+            for inv in investors
+        }
+        article_futures = {} # inv_id -> [future, ...]
+        future_links = {} # future -> (entry url, story_id)
         
-        for entry in entries:
-            title = entry.title
-            link = entry.link
-            published = entry.published
-            
-            # Check exist
-            exists = c.execute('SELECT id FROM news_items WHERE url = ?', (link,)).fetchone()
-            if exists:
+        for fut in as_completed(feed_futures):
+            inv = feed_futures[fut]
+            try:
+                query, entries, cache_update = fut.result()
+            except Exception as e:
+                print(f"  Feed error for {inv['name']}: {e}")
                 continue
             
-            is_paid = is_paid_domain(link)
-            domain = link.split('/')[2]
-            
-            content_snippet = entry.description
-            if not is_paid:
-                extracted = extract_content(link)
-                if extracted:
-                    content_snippet = extracted
-            
-            # Sanitize HTML from content/snippet
-            soup = BeautifulSoup(content_snippet, "html.parser")
-            clean_content = soup.get_text(separator=" ", strip=True)
+            if cache_update:
+                cache_updates[query] = cache_update
+            for e in entries:
+                entry_guids.setdefault(e.link, []).append((query, e.get('id') or e.link))
             
-            summary = summarize_with_llm(title, clean_content, is_paid)
+            known = load_known_urls(c, [e.link for e in entries if e.link not in link_stories])
+            link_stories.update((url, story_id) for url, story_id in known.items() if story_id)
             
-            # Parse date
-            try:
-                # published is like 'Wed, 07 Jan 2026 12:00:00 GMT'
-                pub_date = datetime.datetime.strptime(published, '%a, %d %b %Y %H:%M:%S %Z')
-            except:
-                pub_date = datetime.datetime.now()
-            
-            print(f"  New article: {title}")
-            c.execute('''
-                INSERT OR IGNORE INTO news_items (investor_id, title, url, summary, domain, is_paid, published_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (inv_id, title, link, summary, domain, is_paid, pub_date))
+            # Already stored articles only need the investor link
+            with conn:
+                story_cluster.link_investors(conn, [(known[e.link], inv['id']) for e in entries if known.get(e.link)])
             
-            conn.commit()
-            time.sleep(1) # Be nice
+            leaders, duplicates = cluster_entries(
+                conn, index, inv['id'], [e for e in entries if e.link not in known], link_stories, investor_matcher
+            )
+            linked_count += duplicates
+            for entry, story_id in leaders:
+                fut = article_pool.submit(process_entry, inv['id'], entry, story_id)
+                future_links[fut] = (entry.link, story_id)
+                article_futures.setdefault(inv['id'], []).append(fut)
         
-        # Sleep after each investor to prevent Google 429
-        time.sleep(2)
+        for inv_id, futures in article_futures.items():
+            rows = []
+            for fut in futures:
+                try:
+                    row = fut.result()
+                except Exception as e:
+                    print(f"  Article error: {e}")
+                    link, story_id = future_links[fut]
+                    failed_links.add(link)
+                    if story_id:
+                        failed_stories.add(story_id)
+                    continue
+                print(f"  New article: {row[1]}")
+                rows.append(row)
+            
+            new_count += save_news_items(conn, rows)
 
+    # A story without its leader article is removed again; its near-duplicates from
+    # other investors were only linked to it, so they are retried with it next cycle
+    if failed_stories:
+        with conn:
+            for story_id in failed_stories:
+                story_cluster.delete_story(conn, story_id)
+                index.remove(story_id)
+        failed_links |= {url for url, story_id in link_stories.items() if story_id in failed_stories}
+    
+    # Entries that were not stored stay "new" for the next cycle
+    failed_guids = {}
+    for url in failed_links:
+        for query, guid in entry_guids.get(url, []):
+            failed_guids.setdefault(query, set()).add(guid)
+    for query, guids in failed_guids.items():
+        if query in cache_updates:
+            cache_updates[query] = drop_failed_guids(cache_updates[query], guids)
+    
+    save_feed_cache(conn, cache_updates)
     conn.close()
-    print("Fetch complete.")
+    elapsed = time.monotonic() - started
+    print(f"Fetch complete. {len(investors)} investors, {new_count} new articles, {linked_count} duplicate links in {elapsed:.1f}s.")
+    http_client.print_metrics()
+    if os.getenv("OPENAI_API_KEY"):
+        print(LLM_SUMMARY_CACHE.stats())
 
 import schedule
 import time
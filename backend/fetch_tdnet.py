@@ -1,149 +1,209 @@
-import requests
-from bs4 import BeautifulSoup
+import http_client
 import datetime
 import sqlite3
 import os
 import re
 import time
+import json
 from database import get_db_connection
+from tdnet_parser import TDNET_PAGE_URL, parse_listing
+import analysis_queue
+import xbrl_extract
+import notification_queue
 
 # TDnet Public URL Pattern
 # YYYYMMDD format
 TDNET_LIST_URL = "https://www.release.tdnet.info/inbs/I_list_001_{}.html"
 
-def fetch_tdnet_revisions(target_date=None):
+# Categories saved as revision events: "Upward Revision", "Dividend Revision", "Buybacks"
+# (keywords per category: tdnet_parser.CATEGORY_KEYWORDS / keywords.json "tdnet_categories")
+WATCHED_CATEGORIES = {"revision", "dividend", "buyback"}
+
+MAX_PAGES = 30 # Safety cap (100 rows per page)
+
+def fetch_tdnet_page(date_str, page):
+    """
+    Returns the parsed disclosures of a listing page ([] past the last page: 404 or no rows),
+    or None if the fetch failed (5xx, 429 that outlasted the retries).
+    """
+    url = TDNET_PAGE_URL.format(page, date_str)
+    res = http_client.get(url)
+    if res.status_code == 404:
+        return []
+    if res.status_code != 200:
+        print(f"  TDnet page {page} fetch failed: {res.status_code}")
+        return None
+    return parse_listing(res.content)
+
+def load_watermark(c, date_key):
+    row = c.execute("SELECT last_time, last_ids FROM tdnet_watermarks WHERE date = ?", (date_key,)).fetchone()
+    if not row:
+        return None, set()
+    return row['last_time'], set(json.loads(row['last_ids'] or '[]'))
+
+def save_watermark(conn, date_key, last_time, last_ids):
+    conn.execute("""
+        INSERT INTO tdnet_watermarks (date, last_time, last_ids, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(date) DO UPDATE SET
+            last_time=excluded.last_time,
+            last_ids=excluded.last_ids,
+            updated_at=excluded.updated_at
+    """, (date_key, last_time, json.dumps(sorted(last_ids))))
+
+def collect_new_rows(date_str, wm_time=None, wm_ids=None):
+    """
+    Walks I_list_001, 002, ... (newest first) and stops at the watermark:
+    a row older than wm_time, or a row at wm_time that was already seen.
+    Returns (new rows newest first, complete); complete is False if a page failed,
+    so rows older than the ones returned may still be unread.
+    """
+    wm_ids = wm_ids or set()
+    new_rows = []
+    for page in range(1, MAX_PAGES + 1):
+        rows = fetch_tdnet_page(date_str, page)
+        if rows is None:
+            return new_rows, False
+        if not rows:
+            break
+        
+        for item in rows:
+            if wm_time and (item.time < wm_time or (item.time == wm_time and item.id in wm_ids)):
+                return new_rows, True
+            new_rows.append(item)
+    return new_rows, True
+
+def fetch_tdnet_revisions(target_date=None, incremental=True):
+    """
+    Fetches the TDnet listing for a day and saves matching disclosures.
+    incremental=True only parses rows newer than the per-day watermark
+    (last seen time + disclosure ids at that time) stored in tdnet_watermarks.
+    """
     if not target_date:
         target_date = datetime.datetime.now()
     
     date_str = target_date.strftime('%Y%m%d')
-    url = TDNET_LIST_URL.format(date_str)
-    
-    print(f"Fetching TDnet for {date_str}: {url}")
+    date_key = target_date.strftime('%Y-%m-%d')
+    print(f"Fetching TDnet for {date_str}: {TDNET_LIST_URL.format(date_str)}")
     
     try:
-        res = requests.get(url, timeout=10)
-        if res.status_code != 200:
-            print(f"  TDnet fetch failed: {res.status_code}")
-            return
-        
-        # Parse HTML
-        soup = BeautifulSoup(res.content, 'html.parser')
-        
-        # TDnet structure: Table rows <tr>
-        # Columns changes but usually: Time, Code, Company, Title, PDF Link...
-        # We look for "業績予想の修正" in titles
-        
         conn = get_db_connection()
         c = conn.cursor()
         
-        count = 0
+        wm_time, wm_ids = load_watermark(c, date_key)
+        if not incremental:
+            wm_time, wm_ids = None, set()
+        
+        rows, complete = collect_new_rows(date_str, wm_time, wm_ids)
+        print(f"  {len(rows)} new disclosures since {wm_time or 'start of day'}."
+              + ("" if complete else " Listing incomplete: watermark kept, retried next cycle."))
         
-        # Find all rows (skip header)
-        # Usually inside a table id="main-list-table" or similar class
-        # But broadly searching all tr is safer as structure varies
-        rows = soup.find_all('tr')
+        count = 0
+        to_analyze = [] # (revision_id, is_watched)
+        to_notify = [] # (revision_id, ticker)
+        to_xbrl = [] # (revision_id, xbrl_link)
         
-        for row in rows:
-            cols = row.find_all('td')
-            if len(cols) < 4:
+        for item in rows:
+            title_text = item.title
+            name_text = item.name
+            pdf_link = item.pdf_link
+            
+            # Filter for "Upward Revision", "Dividend Revision", "Buybacks"
+            if not item.categories & WATCHED_CATEGORIES:
                 continue
             
-            # Extract basic info (heuristic based on standard TDnet layout)
-            # Col 0: Time, Col 1: Code, Col 2: Name, Col 3: Title
-            try:
-                code_text = cols[1].get_text().strip()
-                name_text = cols[2].get_text().strip()
-                title_text = cols[3].get_text().strip()
-                
-                # Check link
-                pdf_link = None
-                a_tag = cols[3].find('a')
-                if a_tag:
-                    pdf_link = "https://www.release.tdnet.info/inbs/" + a_tag['href']
-                
-                # Filter for "Upward Revision", "Dividend Revision", "Buybacks"
-                # Keywords: 業績予想の修正, 修正に関するお知らせ, 配当, 剰余金の処分, 自己株式
-                if any(k in title_text for k in ["業績予想の修正", "差異", "配当", "剰余金の処分", "自己株式"]):
-                    ticker = code_text[:4] # 12340 -> 1234
-                    
-                    print(f"  Found Revision: {ticker} {name_text} - {title_text}")
-                    
-                    # Store in DB (MVP: Just the event, numbers need PDF parsing)
-                    # We flag is_upward=NULL initially, logic needs to fill it later
-                    # via XBRL usage or manual check or AI parsing
-                    
-                    # Use INSERT OR REPLACE to ensure title is updated if record exists
-                    # Note: This might overwrite other fields if they changed, but for this use case it's fine.
-                    # Or use UPSERT syntax (SQLite 3.24+)
-                    
-                    c.execute("""
-                        INSERT INTO revisions 
-                        (ticker, company_name, revision_date, source_url, quarter, title)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                        ON CONFLICT(ticker, revision_date) DO UPDATE SET
-                            title=excluded.title,
-                            company_name=excluded.company_name,
-                            source_url=excluded.source_url
-                    """, (
-                        ticker, 
-                        name_text, 
-                        target_date.strftime('%Y-%m-%d'),
-                        pdf_link,
-                        "Unknown",
-                        title_text
-                    ))
-                    
-                    if c.rowcount > 0:
-                        count += 1
-                        print(f"    -> New Revision Saved. Checking alerts...")
-                        
-                        # Check for Watchlist Matches (Alerts table)
-                        # We select users who have this ticker in their alerts
-                        # (Target Price doesn't matter for Revision alerts, imply pure watchlist)
-                        # Or maybe we strictly follow "Alerts" logic?
-                        # User logic: "Notification when revision comes for registered stock"
-                        # -> Implies ANY registration.
-                        
-                        watchers = c.execute("""
-                            SELECT u.id, u.line_user_id, u.email, u.email_notifications 
-                            FROM alerts a
-                            JOIN users u ON a.user_id = u.id
-                            WHERE a.ticker = ? AND u.notify_revisions = 1
-                        """, (ticker,)).fetchall()
-                        
-                        # --- Post to X / LINE Logic MOVED to AI Analysis ---
-                        # Previously we posted here based on keywords, but now we rely on AI result.
-                        # This avoids "Generic Title" ignores and provides better context.
-                        #
-                        # The AI Analysis is triggered at the end of this script.
-                        
-                        # (Optional) We could still send LINE here if we want instant alerts for ALL?
-                        # But let's unify to AI for quality control.
-                        
-                        pass
-
-                    # count += 1 
+            ticker = item.ticker # 12340 -> 1234
             
-            except Exception as e:
-                # print(f"  Row parse error: {e}")
-                continue 
+            print(f"  Found Revision: {ticker} {name_text} - {title_text}")
             
-            except Exception as e:
-                # print(f"  Row parse error: {e}")
+            # Store in DB (MVP: Just the event, numbers need PDF parsing)
+            # We flag is_upward=NULL initially, logic needs to fill it later
+            # via XBRL usage or manual check or AI parsing
+            
+            # Existing revisions (seen by an earlier poll or a non-incremental re-run) only get
+            # their title refreshed: alerting and analysis are for newly inserted ones
+            existing = c.execute("SELECT id FROM revisions WHERE ticker = ? AND revision_date = ?",
+                                 (ticker, date_key)).fetchone()
+            if existing:
+                c.execute("UPDATE revisions SET title = ?, company_name = ?, source_url = ? WHERE id = ?",
+                          (title_text, name_text, pdf_link, existing['id']))
                 continue
             
+            c.execute("""
+                INSERT INTO revisions 
+                (ticker, company_name, revision_date, source_url, quarter, title)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                ticker, 
+                name_text, 
+                date_key,
+                pdf_link,
+                "Unknown",
+                title_text
+            ))
+            rev_id = c.lastrowid
+            
+            count += 1
+            print(f"    -> New Revision Saved. Checking alerts...")
+            
+            # Check for Watchlist Matches (Alerts table)
+            # We select users who have this ticker in their alerts
+            # (Target Price doesn't matter for Revision alerts, imply pure watchlist)
+            # User logic: "Notification when revision comes for registered stock"
+            # -> Implies ANY registration.
+            
+            watchers = notification_queue.WATCHERS.watchers(conn, ticker)
+            
+            # --- Post to X / LINE Logic MOVED to AI Analysis ---
+            # Previously we posted here based on keywords, but now we rely on AI result.
+            # This avoids "Generic Title" ignores and provides better context.
+            #
+            # The AI Analysis runs in analysis_worker.py; we only enqueue here
+            # (watchlisted tickers first).
+            if item.xbrl_link:
+                to_xbrl.append((rev_id, item.xbrl_link))
+            to_analyze.append((rev_id, bool(watchers)))
+            if watchers:
+                to_notify.append((rev_id, ticker))
+        
+        # Advance watermark to the newest row seen, only once every page down to it was read
+        # (a failed page would otherwise skip its older disclosures for good)
+        if rows and complete:
+            newest_time = max(r.time for r in rows)
+            ids = {r.id for r in rows if r.time == newest_time}
+            if newest_time == wm_time:
+                ids |= wm_ids
+            save_watermark(conn, date_key, newest_time, ids)
+        
         conn.commit()
+        
+        # --- Alert watchers right away (sent by notification_worker.py) ---
+        notified = notification_queue.fan_out(conn, to_notify)
+        if notified:
+            print(f"  Queued {notified} watcher notifications.")
+        
+        # --- Exact numbers from the XBRL summary when TDnet ships one ---
+        # Downloaded after the commit (no write lock held during network I/O), one short
+        # transaction per revision; the AI analysis keeps these instead of its own reading of the PDF
+        for rev_id, xbrl_link in to_xbrl:
+            try:
+                forecast = xbrl_extract.fetch_forecast(xbrl_link)
+                if forecast:
+                    numbers = xbrl_extract.save_forecast(conn, rev_id, forecast)
+                    conn.commit()
+                    print(f"  XBRL {rev_id}: OP {forecast['previous']['op']} -> {forecast['revised']['op']} "
+                          f"({numbers.get('revision_rate_op', 'n/a')}%)")
+            except Exception as e:
+                conn.rollback()
+                print(f"  XBRL extraction failed for {rev_id}: {e}")
+        
+        # --- Hand off to AI Analysis workers ---
+        queued = analysis_queue.enqueue(conn, to_analyze)
+        print(f"  Saved {count} revision events. Queued {queued} for AI analysis "
+              f"({analysis_queue.format_stats(analysis_queue.queue_stats(conn))}).")
         conn.close()
-        print(f"  Saved {count} revision events.")
-
-        # --- Trigger AI Analysis ---
-        try:
-            from analyze_revisions_ai import process_revisions
-            print("--- Starting AI Analysis for new revisions ---")
-            process_revisions()
-            print("--- AI Analysis Completed ---")
-        except Exception as e:
-            print(f"Error during AI Analysis trigger: {e}")
+        
+        return count
         
     except Exception as e:
         print(f"Error fetching TDnet: {e}")
@@ -153,5 +213,4 @@ if __name__ == "__main__":
     today = datetime.datetime.now()
     for i in range(7):
         d = today - datetime.timedelta(days=i)
-        fetch_tdnet_revisions(target_date=d)
-        time.sleep(1) # Be nice to server
+        fetch_tdnet_revisions(target_date=d, incremental=False) # Paced by http_client
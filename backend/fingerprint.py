@@ -0,0 +1,74 @@
+import re
+import hashlib
+import unicodedata
+
+# Text fingerprints for near-duplicate detection of news articles.
+# Japanese text has no word boundaries, so shingles are character n-grams.
+
+BOILERPLATE = ["自動収集された記事です", "詳細を見る"]
+NON_WORD_RE = re.compile(r'[\s\W_]+', re.UNICODE)
+
+SHINGLE_SIZE = 3
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4 # 4 x 16-bit bands: distance <= 3 guarantees one identical band
+
+def normalize_text(text):
+    """
+    NFKC (full-width -> half-width), lowercase, boilerplate and punctuation/whitespace removed.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKC', text).lower()
+    for b in BOILERPLATE:
+        text = text.replace(b, "")
+    return NON_WORD_RE.sub("", text)
+
+def shingles(text, k=SHINGLE_SIZE):
+    """
+    Set of character k-grams of already-normalized text.
+    """
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i+k] for i in range(len(text) - k + 1)}
+
+def hash64(s):
+    return int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def simhash(shingle_set):
+    """
+    64-bit SimHash over a shingle set (unweighted).
+    """
+    counts = [0] * SIMHASH_BITS
+    for sh in shingle_set:
+        h = hash64(sh)
+        for bit in range(SIMHASH_BITS):
+            counts[bit] += 1 if (h >> bit) & 1 else -1
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if counts[bit] > 0:
+            value |= 1 << bit
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def simhash_bands(value, bands=SIMHASH_BANDS):
+    width = SIMHASH_BITS // bands
+    mask = (1 << width) - 1
+    return [(value >> (i * width)) & mask for i in range(bands)]
+
+def to_signed64(value):
+    """
+    SQLite INTEGER is signed 64-bit.
+    """
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def to_unsigned64(value):
+    return value + (1 << 64) if value < 0 else value
+
+def article_fingerprint(title, text):
+    """
+    Returns (normalized_text, simhash) for title + body.
+    """
+    norm = normalize_text(f"{title or ''} {text or ''}")
+    return norm, simhash(shingles(norm))
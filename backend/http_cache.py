@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import gzip
+import time
+import hashlib
+import datetime
+import threading
+
+# Persistent on-disk response cache for scraper backfills.
+# - Content-addressed by sha256(url), gzip-compressed
+# - TTL per URL pattern (past-date pages are immutable, today's pages expire quickly)
+# - LRU eviction by total size (file mtime is bumped on every hit)
+
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.http_cache'))
+MAX_CACHE_BYTES = int(os.environ.get("HTTP_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+
+FOREVER = -1 # TTL marker for immutable pages
+TODAY_TTL = 5 * 60
+
+# Pages that embed a date: I_list_001_YYYYMMDD.html (TDnet), ?date=YYYYMMDD (Kabutan news)
+DATE_IN_URL_RE = re.compile(r'(?:I_list_\d{3}_|[?&]date=)(\d{8})')
+
+# (pattern, ttl seconds) for pages without a date; first match wins
+TTL_RULES = [
+    (re.compile(r'kabutan\.jp/stock/finance'), 12 * 3600),
+]
+
+def ttl_for_url(url, today=None):
+    """
+    Returns the TTL in seconds for url, FOREVER for immutable pages, or 0 to skip caching.
+    """
+    m = DATE_IN_URL_RE.search(url)
+    if m:
+        try:
+            page_date = datetime.datetime.strptime(m.group(1), '%Y%m%d').date()
+        except ValueError:
+            return 0
+        today = today or datetime.date.today()
+        return FOREVER if page_date < today else TODAY_TTL
+
+    for pattern, ttl in TTL_RULES:
+        if pattern.search(url):
+            return ttl
+    return 0
+
+class ResponseCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = None # Computed lazily on first write
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.gz')
+
+    def get(self, url):
+        """
+        Returns (headers, body) or None if missing/expired.
+        """
+        path = self._path(url)
+        try:
+            with gzip.open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        expires_at = meta.get('expires_at')
+        if expires_at is not None and expires_at < time.time():
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path) # LRU: mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return meta.get('headers', {}), body
+
+    def put(self, url, headers, body, ttl):
+        if ttl == 0:
+            return
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        meta = {
+            'url': url,
+            'headers': {k: v for k, v in headers.items() if k.lower() in ('content-type', 'etag', 'last-modified')},
+            'stored_at': time.time(),
+            'expires_at': None if ttl == FOREVER else time.time() + ttl
+        }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(json.dumps(meta).encode('utf-8') + b"\n")
+            f.write(body)
+
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        new_size = os.path.getsize(path)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += new_size - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.gz'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._files())
+
+    def _evict(self):
+        """
+        Deletes least recently used files until the cache is at 90% of max_bytes.
+        """
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(self._files(), key=lambda f: f[2]):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self.total_bytes -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        return f"cache hits {self.hits}/{total} ({rate:.0f}%)"
+
+response_cache = ResponseCache()
@@ -0,0 +1,167 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from requests.structures import CaseInsensitiveDict
+from rate_limit import DomainLimiter, get_host
+from http_cache import response_cache, ttl_for_url
+
+# Shared HTTP layer for all scrapers:
+# - one pooled Session (keep-alive / TLS reuse per host)
+# - gzip (+ brotli if the brotli package is installed)
+# - retry with backoff on 429/5xx, honoring Retry-After
+# - per-host concurrency + rate limits
+# - request metrics (latency, bytes, status counts)
+# - optional on-disk response cache (get(url, cache=True), see http_cache.py)
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+DEFAULT_TIMEOUT = 10
+
+# Per-host limits: (max concurrent requests, requests per second)
+# "host/path" keys are separate buckets for those URLs (see rate_limit.DomainLimiter)
+DEFAULT_HOST_LIMIT = (2, 1.0)
+HOST_LIMITS = {
+    "news.google.com/rss/search": (1, 0.5), # RSS queries: Google returns 429 quickly
+    "news.google.com": (4, 4.0), # Article links (/rss/articles/... redirects to the publisher)
+    "kabutan.jp": (1, 1.0),
+    "www.release.tdnet.info": (2, 1.0),
+    "www.jpx.co.jp": (1, 0.5),
+    "finance.yahoo.co.jp": (1, 1.0),
+    "disclosure.edinet-fsa.go.jp": (2, 2.0),
+}
+
+try:
+    import brotli # noqa: F401 (urllib3 decodes "br" when available)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+_session = None
+_session_lock = threading.Lock()
+host_limiter = DomainLimiter(*DEFAULT_HOST_LIMIT, overrides=HOST_LIMITS)
+
+def get_session():
+    """
+    Returns the process-wide pooled Session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=1.0,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET", "HEAD"],
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                'User-Agent': DEFAULT_USER_AGENT,
+                'Accept-Encoding': ACCEPT_ENCODING,
+            })
+            _session = session
+        return _session
+
+class RequestMetrics:
+    """
+    Per-host request counters. Thread-safe.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def record(self, host, status, elapsed, size):
+        with self.lock:
+            m = self.hosts.setdefault(host, {'requests': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0, 'status': {}})
+            m['requests'] += 1
+            m['seconds'] += elapsed
+            m['bytes'] += size
+            if status is None:
+                m['errors'] += 1
+            else:
+                m['status'][status] = m['status'].get(status, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {h: dict(m, status=dict(m['status'])) for h, m in self.hosts.items()}
+
+    def reset(self):
+        with self.lock:
+            self.hosts = {}
+
+metrics = RequestMetrics()
+
+def request(method, url, **kwargs):
+    """
+    Drop-in replacement for requests.request using the shared session.
+    Applies the default timeout and the per-host rate limit.
+    """
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    host = get_host(url)
+    started = time.monotonic()
+    try:
+        with host_limiter.slot(url):
+            res = get_session().request(method, url, **kwargs)
+    except Exception:
+        metrics.record(host, None, time.monotonic() - started, 0)
+        raise
+
+    # Streamed bodies are not read here; fall back to Content-Length
+    if kwargs.get('stream'):
+        size = int(res.headers.get('Content-Length') or 0)
+    else:
+        size = len(res.content)
+    metrics.record(host, res.status_code, time.monotonic() - started, size)
+    return res
+
+def _cached_response(url, headers, body):
+    res = requests.Response()
+    res.status_code = 200
+    res.url = url
+    res.headers = CaseInsensitiveDict(headers)
+    res._content = body
+    res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+    return res
+
+def get(url, cache=False, **kwargs):
+    """
+    GET through the shared session.
+    cache=True serves/stores 200 responses in the on-disk cache using the
+    TTL rules from http_cache (past-date pages never expire).
+    """
+    if cache:
+        hit = response_cache.get(url)
+        if hit:
+            return _cached_response(url, *hit)
+
+    res = request("GET", url, **kwargs)
+
+    if cache and res.status_code == 200 and not kwargs.get('stream'):
+        try:
+            response_cache.put(url, res.headers, res.content, ttl_for_url(url))
+        except OSError as e:
+            print(f"  [HTTP cache] write failed: {e}")
+    return res
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def print_metrics():
+    """
+    Prints a per-host summary of requests made in this process.
+    """
+    snapshot = metrics.snapshot()
+    if response_cache.hits or response_cache.misses:
+        print(f"HTTP {response_cache.stats()}")
+    if not snapshot:
+        return
+    print("HTTP metrics:")
+    for host, m in sorted(snapshot.items()):
+        avg_ms = (m['seconds'] / m['requests'] * 1000) if m['requests'] else 0
+        statuses = ", ".join(f"{k}:{v}" for k, v in sorted(m['status'].items()))
+        print(f"  {host}: {m['requests']} req, {m['bytes'] / 1024:.0f} KB, avg {avg_ms:.0f} ms, errors {m['errors']} [{statuses}]")
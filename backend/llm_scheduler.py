@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import sqlite3
+from database import DB_NAME
+
+# Shared Gemini call scheduler (all processes: analysis worker, backlog, news summaries).
+# - Token buckets for requests/minute, tokens/minute and requests/day, stored in the
+#   llm_quota_state table so every process draws from the same quota
+# - 429 / quota errors pause all callers: Retry-After hint if the error has one,
+#   otherwise exponential backoff that resets after a success
+# - Priority lanes: LANE_LIVE (new TDnet disclosures) may use the whole budget,
+#   LANE_BACKGROUND (backlog, news summaries) leaves BACKGROUND_RESERVE of each bucket to live calls
+
+LANE_LIVE = 0
+LANE_BACKGROUND = 1
+
+# Provider budget (Gemini Flash free tier by default)
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", 15))
+GEMINI_TPM = int(os.environ.get("GEMINI_TPM", 1000000))
+GEMINI_RPD = int(os.environ.get("GEMINI_RPD", 1500))
+
+BACKGROUND_RESERVE = 0.2 # Share of each bucket kept for live calls
+BASE_BACKOFF = 30 # Seconds after the first 429 without a retry hint
+MAX_BACKOFF = 15 * 60
+DAILY_QUOTA_BACKOFF = 60 * 60 # "per day" quota errors
+MAX_RETRIES = 3 # 429s before call() gives up with QUOTA_EXCEEDED
+MAX_WAIT_STEP = 60 # Re-check the shared state at least this often while waiting
+
+RETRY_HINT_RES = [
+    re.compile(r'retry in (\d+(?:\.\d+)?)\s*s', re.IGNORECASE),
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)'),
+    re.compile(r'retry[- ]after:?\s*(\d+)', re.IGNORECASE),
+]
+
+def is_rate_limit_error(e):
+    text = str(e)
+    return ("429" in text or "quota" in text.lower() or "QUOTA_EXCEEDED" in text
+            or type(e).__name__ in ("ResourceExhausted", "TooManyRequests"))
+
+def parse_retry_after(e):
+    """
+    Returns the server's retry hint in seconds, or None.
+    """
+    hint = getattr(e, 'retry_after', None)
+    if hint:
+        return float(hint)
+    for pattern in RETRY_HINT_RES:
+        m = pattern.search(str(e))
+        if m:
+            return float(m.group(1))
+    return None
+
+class LlmScheduler:
+    def __init__(self, model, rpm=GEMINI_RPM, tpm=GEMINI_TPM, rpd=GEMINI_RPD, db_path=DB_NAME):
+        self.model = model
+        self.db_path = db_path
+        # bucket: (capacity, refill per second)
+        self.buckets = {
+            'rpm': (float(rpm), rpm / 60.0),
+            'tpm': (float(tpm), tpm / 60.0),
+            'rpd': (float(rpd), rpd / 86400.0),
+        }
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _load(self, conn, now):
+        row = conn.execute("""
+            SELECT rpm_tokens, tpm_tokens, rpd_tokens, updated_at, paused_until, strikes
+            FROM llm_quota_state WHERE model = ?
+        """, (self.model,)).fetchone()
+        if not row:
+            state = {name: cap for name, (cap, _) in self.buckets.items()}
+            state.update(updated_at=now, paused_until=0.0, strikes=0)
+            return state
+
+        state = {'rpm': row[0], 'tpm': row[1], 'rpd': row[2],
+                 'updated_at': row[3], 'paused_until': row[4] or 0.0, 'strikes': row[5] or 0}
+        elapsed = max(0.0, now - state['updated_at'])
+        for name, (cap, rate) in self.buckets.items():
+            state[name] = min(cap, state[name] + elapsed * rate)
+        state['updated_at'] = now
+        return state
+
+    def _save(self, conn, state):
+        conn.execute("""
+            INSERT INTO llm_quota_state (model, rpm_tokens, tpm_tokens, rpd_tokens, updated_at, paused_until, strikes)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(model) DO UPDATE SET
+                rpm_tokens=excluded.rpm_tokens,
+                tpm_tokens=excluded.tpm_tokens,
+                rpd_tokens=excluded.rpd_tokens,
+                updated_at=excluded.updated_at,
+                paused_until=excluded.paused_until,
+                strikes=excluded.strikes
+        """, (self.model, state['rpm'], state['tpm'], state['rpd'],
+              state['updated_at'], state['paused_until'], state['strikes']))
+
+    def _try_acquire(self, lane, tokens):
+        """
+        Takes 1 request + tokens from the shared buckets.
+        Returns 0 on success, otherwise the seconds to wait before trying again.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            state = self._load(conn, now)
+
+            if state['paused_until'] > now:
+                conn.execute("COMMIT")
+                return state['paused_until'] - now
+
+            reserve = BACKGROUND_RESERVE if lane != LANE_LIVE else 0.0
+            needs = {'rpm': 1, 'tpm': min(tokens, self.buckets['tpm'][0] * (1 - reserve)), 'rpd': 1}
+            wait = 0.0
+            for name, amount in needs.items():
+                cap, rate = self.buckets[name]
+                required = amount + cap * reserve
+                if state[name] < required:
+                    wait = max(wait, (required - state[name]) / rate)
+
+            if wait == 0.0:
+                for name, amount in needs.items():
+                    state[name] -= amount
+            self._save(conn, state)
+            conn.execute("COMMIT")
+            return wait
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, lane=LANE_LIVE, tokens=1):
+        """
+        Blocks until the shared quota allows one more call.
+        """
+        while True:
+            wait = self._try_acquire(lane, tokens)
+            if wait <= 0:
+                return
+            if wait > 5:
+                print(f"  [LLM] Waiting {wait:.0f}s for {self.model} quota (lane {lane})...")
+            time.sleep(min(wait, MAX_WAIT_STEP))
+
+    def paused_for(self):
+        """
+        Seconds left on the pause set after a 429 (0 if callers are not paused).
+        """
+        conn = self._connect()
+        try:
+            state = self._load(conn, time.time())
+        finally:
+            conn.close()
+        return max(0.0, state['paused_until'] - time.time())
+
+    def wait_until_resumed(self):
+        """
+        Blocks while all callers are paused, without taking quota.
+        """
+        while True:
+            wait = self.paused_for()
+            if wait <= 0:
+                return
+            print(f"  [LLM] {self.model} paused. Waiting {wait:.0f}s...")
+            time.sleep(min(wait, MAX_WAIT_STEP))
+
+    def _update(self, fn):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            state = self._load(conn, time.time())
+            fn(state)
+            self._save(conn, state)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def report_success(self):
+        def reset(state):
+            state['strikes'] = 0
+        self._update(reset)
+
+    def report_rate_limited(self, retry_after=None, daily=False):
+        """
+        Pauses every caller: retry_after if the server sent one, otherwise exponential backoff.
+        """
+        def pause(state):
+            state['strikes'] += 1
+            if daily:
+                delay = DAILY_QUOTA_BACKOFF
+                state['rpd'] = 0.0
+            elif retry_after:
+                delay = retry_after
+            else:
+                delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (state['strikes'] - 1))
+            state['rpm'] = 0.0 # The server says we are over the minute budget
+            state['paused_until'] = max(state['paused_until'], time.time() + delay)
+            print(f"  [LLM] {self.model} rate limited. Pausing all callers for {delay:.0f}s.")
+        self._update(pause)
+
+    def call(self, fn, lane=LANE_LIVE, tokens=1):
+        """
+        Runs fn() inside the quota, retrying after 429s (up to MAX_RETRIES).
+        Raises Exception("QUOTA_EXCEEDED: ...") if the quota stays exhausted.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            self.acquire(lane, tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self.report_rate_limited(parse_retry_after(e), daily="PerDay" in str(e))
+                if attempt == MAX_RETRIES:
+                    raise Exception(f"QUOTA_EXCEEDED: {e}")
+                continue
+            self.report_success()
+            return result
+
+    def status(self):
+        conn = self._connect()
+        try:
+            state = self._load(conn, time.time())
+        except sqlite3.Error:
+            return f"{self.model}: quota state unavailable"
+        finally:
+            conn.close()
+        paused = max(0, state['paused_until'] - time.time())
+        return (f"{self.model}: rpm {state['rpm']:.1f}/{self.buckets['rpm'][0]:.0f}, "
+                f"rpd {state['rpd']:.0f}/{self.buckets['rpd'][0]:.0f}"
+                + (f", paused {paused:.0f}s" if paused else ""))
+
+gemini_flash = LlmScheduler('gemini-1.5-flash')
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import unicodedata
+
+# Shared matching utilities:
+# - DomainMatcher: hostname-suffix matching via set lookups (cost grows with label count, not list size)
+# - KeywordMatcher: all keywords compiled into one regex, matched in a single pass
+# - InvestorMatcher: tracked investor names/aliases on a KeywordMatcher over normalized text
+#   (EDINET filer names in fetch_edinet, article titles in fetch_news)
+# Keyword lists can be overridden in keywords.json (same directory).
+
+CONFIG_PATH = os.environ.get("KEYWORDS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keywords.json'))
+
+_config = None
+
+def load_keywords(name, default):
+    """
+    Returns the list (or {category: list} dict) `name` from keywords.json, or default if the file/key is missing.
+    """
+    global _config
+    if _config is None:
+        try:
+            with open(CONFIG_PATH, encoding='utf-8') as f:
+                _config = json.load(f)
+        except (OSError, ValueError):
+            _config = {}
+    if isinstance(default, dict):
+        return _config.get(name) or dict(default)
+    return _config.get(name) or list(default)
+
+def extract_host(url_or_host):
+    s = url_or_host.strip().lower()
+    if '://' in s:
+        s = s.split('://', 1)[1]
+    s = s.split('/', 1)[0].split('?', 1)[0]
+    s = s.rsplit('@', 1)[-1].split(':', 1)[0]
+    return s.rstrip('.')
+
+class DomainMatcher:
+    """
+    Matches a URL's hostname against a list of domains.
+    "nikkei.com" matches "nikkei.com" and "www.nikkei.com", but not "notnikkei.com".
+    """
+    def __init__(self, domains):
+        self.domains = {extract_host(d) for d in domains if d}
+
+    def match(self, url):
+        """
+        Returns the matched domain or None.
+        """
+        labels = extract_host(url).split('.')
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            if suffix in self.domains:
+                return suffix
+        return None
+
+    def __contains__(self, url):
+        return self.match(url) is not None
+
+class KeywordMatcher:
+    """
+    Substring matcher for many keywords, compiled once into a single regex.
+    Longer keywords take priority at the same position.
+    """
+    def __init__(self, keywords):
+        self.keywords = sorted({k for k in keywords if k}, key=len, reverse=True)
+        # Keywords contained in a longer keyword (reported together with it)
+        self.contained = {k: {j for j in self.keywords if j in k} for k in self.keywords}
+        if self.keywords:
+            alternation = '|'.join(re.escape(k) for k in self.keywords)
+            self.pattern = re.compile(alternation)
+            self.overlapping = re.compile(f'(?=({alternation}))')
+        else:
+            self.pattern = None
+            self.overlapping = None
+
+    def search(self, text):
+        """
+        Returns the first matched keyword or None.
+        """
+        if not self.pattern or not text:
+            return None
+        m = self.pattern.search(text)
+        return m.group(0) if m else None
+
+    def find_all(self, text):
+        """
+        Returns the set of keywords found in text (one pass, overlapping allowed).
+        """
+        if not self.overlapping or not text:
+            return set()
+        found = set()
+        for m in self.overlapping.finditer(text):
+            found |= self.contained[m.group(1)]
+        return found
+
+    def __contains__(self, text):
+        return self.search(text) is not None
+
+# Company-form markers ignored when matching names (after NFKC: ㈱ -> (株))
+CORPORATE_FORMS_RE = re.compile(r'株式会社|有限会社|合同会社|\(株\)|\(有\)|\(同\)')
+# ASCII forms only as the trailing token (before spaces are removed), so "Prince" or "Lincoln" stay intact
+LATIN_CORPORATE_FORMS_RE = re.compile(r'[\s,]*\b(co\.,?\s*ltd\.?|inc\.?|ltd\.?|llc|corporation)$')
+MIN_NAME_LENGTH = 2 # Shorter normalized names would match almost anything
+
+def normalize_name(text):
+    """
+    Full/half width folded (NFKC), lowercased, spaces and company forms (株式会社 etc., a trailing Inc./Ltd.) removed.
+    """
+    if not text:
+        return ''
+    s = unicodedata.normalize('NFKC', text).lower().strip()
+    s = LATIN_CORPORATE_FORMS_RE.sub('', s)
+    s = re.sub(r'\s+', '', s)
+    return CORPORATE_FORMS_RE.sub('', s)
+
+def parse_aliases(aliases):
+    """
+    investors.aliases is a JSON list; older rows may hold a comma-separated string.
+    """
+    if not aliases:
+        return []
+    try:
+        parsed = json.loads(aliases)
+        if isinstance(parsed, list):
+            return [str(a).strip() for a in parsed if str(a).strip()]
+    except ValueError:
+        pass
+    return [a.strip() for a in aliases.split(',') if a.strip()]
+
+class InvestorMatcher:
+    """
+    Finds tracked investors in a text (filer name, article title) in one pass.
+    Built once per run from investors rows (id, name, aliases).
+    """
+    def __init__(self, investors):
+        self.investors = {}
+        self.targets = {} # normalized name/alias -> {investor_id}
+        for inv in investors:
+            inv_id, name = inv['id'], inv['name']
+            self.investors[inv_id] = {'id': inv_id, 'name': name}
+            for target in [name] + parse_aliases(inv['aliases']):
+                key = normalize_name(target)
+                if len(key) >= MIN_NAME_LENGTH:
+                    self.targets.setdefault(key, set()).add(inv_id)
+        self.keywords = KeywordMatcher(self.targets)
+
+    def find_all(self, text):
+        """
+        Returns the investors ({id, name}) named in text, sorted by id.
+        """
+        ids = set()
+        for key in self.keywords.find_all(normalize_name(text)):
+            ids |= self.targets[key]
+        return [self.investors[i] for i in sorted(ids)]
+
+    def match(self, text):
+        """
+        Returns the first named investor (longest name/alias at that position), or None.
+        """
+        key = self.keywords.search(normalize_name(text))
+        if not key:
+            return None
+        return self.investors[min(self.targets[key])]
+
+    def __len__(self):
+        return len(self.investors)
@@ -0,0 +1,29 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating analysis_cache table...")
+    # AI analysis results per PDF content + prompt version (analysis_cache.py)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            content_hash TEXT NOT NULL, -- sha256 of the PDF bytes
+            prompt_version TEXT NOT NULL,
+            result TEXT NOT NULL, -- JSON returned by the analysis
+            hits INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_hit_at DATETIME,
+            PRIMARY KEY (content_hash, prompt_version)
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'analysis_cache' table created.")
+
+if __name__ == "__main__":
+    migrate()
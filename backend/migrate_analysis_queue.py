@@ -0,0 +1,32 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating analysis_queue table...")
+    # Work queue between the TDnet poller and the AI analysis workers
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_queue (
+            revision_id INTEGER PRIMARY KEY,
+            priority INTEGER DEFAULT 1, -- 0 = watchlisted ticker, 1 = others
+            status TEXT DEFAULT 'pending', -- pending, deferred, processing, done, failed
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            enqueued_at DATETIME,
+            started_at DATETIME,
+            finished_at DATETIME,
+            FOREIGN KEY (revision_id) REFERENCES revisions (id)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_analysis_queue_next ON analysis_queue (status, priority, enqueued_at)")
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'analysis_queue' table created.")
+
+if __name__ == "__main__":
+    migrate()
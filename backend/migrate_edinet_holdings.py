@@ -0,0 +1,42 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+
+    print("Creating edinet_holdings table...")
+    # Structured contents of ownership reports (edinet_holdings.py, from the type=5 CSV package)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS edinet_holdings (
+            doc_id TEXT PRIMARY KEY,
+            status TEXT, -- done, error (retried up to MAX_ATTEMPTS)
+            attempts INTEGER DEFAULT 0,
+            issuer_ticker TEXT, -- 4-digit code
+            issuer_name TEXT,
+            holder_name TEXT,
+            holder_edinet_code TEXT,
+            investor_id INTEGER,
+            holding_ratio REAL, -- % (joint holders total if reported)
+            previous_ratio REAL, -- % in the previous report
+            ratio_change REAL, -- percentage points
+            shares_held INTEGER,
+            obligation_date DATE, -- 報告義務発生日
+            submitted_at DATETIME,
+            updated_at DATETIME,
+            FOREIGN KEY (doc_id) REFERENCES edinet_documents (id),
+            FOREIGN KEY (investor_id) REFERENCES investors (id)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_edinet_holdings_issuer ON edinet_holdings (issuer_ticker, obligation_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_edinet_holdings_holder ON edinet_holdings (holder_name, obligation_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_edinet_holdings_investor ON edinet_holdings (investor_id, obligation_date)")
+
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'edinet_holdings' table created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,28 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+
+    print("Creating edinet_sweep_days table...")
+    # Per-date checkpoint of backfill_edinet.py (re-runs skip finished dates)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS edinet_sweep_days (
+            date DATE PRIMARY KEY,
+            status TEXT, -- done, error, partial (today: the list is still growing)
+            documents INTEGER DEFAULT 0, -- All documents listed for the date
+            matched INTEGER DEFAULT 0, -- Ownership reports (120/130/140)
+            saved INTEGER DEFAULT 0, -- New edinet_documents rows
+            updated_at DATETIME
+        )
+    """)
+
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'edinet_sweep_days' table created.")
+
+if __name__ == "__main__":
+    migrate()
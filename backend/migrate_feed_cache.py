@@ -0,0 +1,26 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating feed_cache table...")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS feed_cache (
+            query TEXT PRIMARY KEY,
+            etag TEXT,
+            modified TEXT,
+            guids TEXT, -- JSON list of entry GUIDs from the last response
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'feed_cache' table created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,29 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating llm_quota_state table...")
+    # Shared Gemini quota (token buckets + backoff) for llm_scheduler.py, one row per model
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS llm_quota_state (
+            model TEXT PRIMARY KEY,
+            rpm_tokens REAL,
+            tpm_tokens REAL,
+            rpd_tokens REAL,
+            updated_at REAL, -- Unix time of the last refill
+            paused_until REAL DEFAULT 0, -- Unix time, set after 429
+            strikes INTEGER DEFAULT 0 -- Consecutive 429s (backoff exponent)
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'llm_quota_state' table created.")
+
+if __name__ == "__main__":
+    migrate()
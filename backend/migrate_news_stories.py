@@ -0,0 +1,62 @@
+import sqlite3
+import os
+import json
+from story_cluster import minhash_signature
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Checking 'news_items' table columns...")
+    c.execute("PRAGMA table_info(news_items)")
+    columns = [r[1] for r in c.fetchall()]
+    
+    if 'story_id' not in columns:
+        print("Adding 'story_id' column...")
+        c.execute("ALTER TABLE news_items ADD COLUMN story_id INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_news_items_story ON news_items (story_id)")
+    
+    print("Creating news_stories / story_investors tables...")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS news_stories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            canonical_news_id INTEGER, -- First stored article of the story
+            title TEXT,
+            signature TEXT, -- JSON MinHash signature
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (canonical_news_id) REFERENCES news_items (id)
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS story_investors (
+            story_id INTEGER NOT NULL,
+            investor_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (story_id, investor_id),
+            FOREIGN KEY (story_id) REFERENCES news_stories (id) ON DELETE CASCADE,
+            FOREIGN KEY (investor_id) REFERENCES investors (id)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_story_investors_investor ON story_investors (investor_id)")
+    
+    # Backfill: one story per existing article
+    # (signature from the title, the same input fetch_news.cluster_entries uses)
+    rows = c.execute("SELECT id, title, investor_id FROM news_items WHERE story_id IS NULL").fetchall()
+    print(f"Backfilling {len(rows)} existing articles...")
+    for news_id, title, investor_id in rows:
+        sig = minhash_signature(title)
+        c.execute("INSERT INTO news_stories (canonical_news_id, title, signature) VALUES (?, ?, ?)",
+                  (news_id, title, json.dumps(sig) if sig else None))
+        story_id = c.lastrowid
+        c.execute("UPDATE news_items SET story_id = ? WHERE id = ?", (story_id, news_id))
+        if investor_id:
+            c.execute("INSERT OR IGNORE INTO story_investors (story_id, investor_id) VALUES (?, ?)", (story_id, investor_id))
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: news stories created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,38 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+
+    print("Creating notification_deliveries table...")
+    # Revision alerts to watchers (fan-out by fetch_tdnet / analysis, sent by notification_worker.py)
+    # One row per (user, revision, channel): a user is never notified twice about the same revision
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS notification_deliveries (
+            user_id INTEGER NOT NULL,
+            revision_id INTEGER NOT NULL,
+            channel TEXT NOT NULL, -- line, email
+            address TEXT NOT NULL, -- LINE user id / email address at fan-out time
+            status TEXT DEFAULT 'pending', -- pending, sending, sent, failed
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            enqueued_at DATETIME,
+            started_at DATETIME,
+            sent_at DATETIME,
+            PRIMARY KEY (user_id, revision_id, channel),
+            FOREIGN KEY (revision_id) REFERENCES revisions (id)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notification_deliveries_next ON notification_deliveries (status, enqueued_at)")
+    # Watcher index lookups (alerts JOIN users by ticker)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_ticker ON alerts (ticker)")
+
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'notification_deliveries' table created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,33 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating summary_cache table...")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS summary_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL, -- 'news_llm' (fetch_news) / 'ai_summary' (summarize_news)
+            simhash INTEGER NOT NULL,
+            band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER,
+            summary TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_hit_at TIMESTAMP
+        )
+    """)
+    
+    # Near-duplicate lookup hits one of the 4 band indexes
+    for i in range(4):
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_summary_cache_band{i} ON summary_cache (kind, band{i})")
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'summary_cache' table created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,29 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating summary_queue table...")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS summary_queue (
+            news_id INTEGER PRIMARY KEY,
+            status TEXT DEFAULT 'pending', -- pending / done / failed
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (news_id) REFERENCES news_items (id) ON DELETE CASCADE
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_summary_queue_status ON summary_queue (status, enqueued_at)")
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'summary_queue' table created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,28 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating tdnet_backfill_days table...")
+    # Per-day checkpoint of backfill_revisions.py (re-runs skip finished days)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS tdnet_backfill_days (
+            date DATE PRIMARY KEY,
+            status TEXT, -- done, missing (404 / beyond retention), error
+            pages INTEGER DEFAULT 0,
+            matched INTEGER DEFAULT 0, -- Rows matching the revision filter
+            saved INTEGER DEFAULT 0, -- New revisions inserted
+            updated_at DATETIME
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'tdnet_backfill_days' table created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,26 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
+
+def migrate():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    
+    print("Creating tdnet_watermarks table...")
+    # Per-day position of the incremental TDnet poller
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS tdnet_watermarks (
+            date DATE PRIMARY KEY,
+            last_time TEXT, -- Newest disclosure time seen (HH:MM)
+            last_ids TEXT, -- JSON list of disclosure ids seen at last_time
+            updated_at DATETIME
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+    print("Migration complete: 'tdnet_watermarks' table created.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,179 @@
+import time
+import sqlite3
+import datetime
+import threading
+
+# Revision alert fan-out to watchers (users with an alert on the ticker and notify_revisions = 1).
+#
+# Producers (fetch_tdnet on a new disclosure, the AI analysis once a revision is analyzed)
+# call fan_out(): watchers come from an in-memory ticker -> users index, and one
+# notification_deliveries row is inserted per (user, revision, channel). The primary key
+# dedups, so the analysis step only adds deliveries the disclosure step missed.
+# notification_worker.py sends them in batches.
+#
+# status: pending -> sending -> sent / failed
+
+CHANNEL_LINE = 'line'
+CHANNEL_EMAIL = 'email'
+
+MAX_ATTEMPTS = 3
+STALE_SENDING_MINUTES = 10 # Reclaim deliveries from crashed workers
+INDEX_REFRESH_SECONDS = 5 # Minimum interval between index change checks
+
+def _now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+class WatcherIndex:
+    """
+    ticker -> { user_id: (line_user_id, email or None) } for revision alerts.
+    refresh() is incremental: new alerts (id above the last loaded one) are added in place;
+    deleted alerts or changed user settings (detected by a fingerprint) trigger a full reload.
+    """
+    def __init__(self):
+        self.by_ticker = {}
+        self.users = {} # user_id -> (line_user_id, email or None), None if not notifiable
+        self.last_alert_id = 0
+        self.alert_count = 0
+        self.users_fingerprint = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def _users_fingerprint(self, conn):
+        return tuple(conn.execute("""
+            SELECT COUNT(*), SUM(notify_revisions), SUM(email_notifications),
+                   TOTAL(LENGTH(line_user_id)), TOTAL(LENGTH(email)), MAX(id)
+            FROM users
+        """).fetchone())
+
+    def _load_users(self, conn):
+        self.users = {}
+        for row in conn.execute("""
+            SELECT id, line_user_id, email, email_notifications FROM users WHERE notify_revisions = 1
+        """):
+            email = row[2] if row[3] == 1 else None
+            if row[1] or email:
+                self.users[row[0]] = (row[1], email)
+
+    def _add_alerts(self, conn, min_id):
+        rows = conn.execute("SELECT id, user_id, ticker FROM alerts WHERE id > ? ORDER BY id", (min_id,)).fetchall()
+        for alert_id, user_id, ticker in rows:
+            self.last_alert_id = max(self.last_alert_id, alert_id)
+            if user_id not in self.users and str(user_id).isdigit():
+                user_id = int(user_id) # alerts.user_id may be stored as text
+            user = self.users.get(user_id)
+            if user:
+                self.by_ticker.setdefault(str(ticker), {})[user_id] = user
+        return len(rows)
+
+    def refresh(self, conn, force=False):
+        with self.lock:
+            if not force and time.monotonic() - self.checked_at < INDEX_REFRESH_SECONDS:
+                return
+            self.checked_at = time.monotonic()
+
+            alert_count, max_alert_id = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM alerts").fetchone()
+            fingerprint = self._users_fingerprint(conn)
+
+            if fingerprint != self.users_fingerprint or alert_count < self.alert_count or force:
+                # Full reload
+                self.by_ticker = {}
+                self.last_alert_id = 0
+                self._load_users(conn)
+                self._add_alerts(conn, 0)
+                self.users_fingerprint = fingerprint
+                self.alert_count = alert_count
+                print(f"  [Notify] Watcher index loaded: {len(self.by_ticker)} tickers, {len(self.users)} users.")
+                return
+
+            if max_alert_id > self.last_alert_id:
+                added = self._add_alerts(conn, self.last_alert_id)
+                self.alert_count += added
+
+            if alert_count != self.alert_count:
+                # Alerts deleted and re-added in between: resync on the next call
+                self.users_fingerprint = None
+                self.checked_at = 0.0
+
+    def watchers(self, conn, ticker):
+        """
+        Returns { user_id: (line_user_id, email or None) } for the ticker.
+        """
+        self.refresh(conn)
+        return dict(self.by_ticker.get(str(ticker), {}))
+
+# Shared by everything in this process (poller, analysis worker)
+WATCHERS = WatcherIndex()
+
+def fan_out(conn, revisions):
+    """
+    revisions: iterable of (revision_id, ticker).
+    Inserts one delivery per watcher and channel; already notified (user, revision, channel)
+    pairs are ignored. Returns the number of new deliveries.
+    """
+    rows = []
+    for revision_id, ticker in revisions:
+        for user_id, (line_user_id, email) in WATCHERS.watchers(conn, ticker).items():
+            if line_user_id:
+                rows.append((user_id, revision_id, CHANNEL_LINE, line_user_id, _now()))
+            if email:
+                rows.append((user_id, revision_id, CHANNEL_EMAIL, email, _now()))
+    if not rows:
+        return 0
+    before = conn.total_changes
+    conn.executemany("""
+        INSERT OR IGNORE INTO notification_deliveries (user_id, revision_id, channel, address, enqueued_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return conn.total_changes - before
+
+def claim_batch(conn, limit):
+    """
+    Atomically claims up to limit pending deliveries (oldest first).
+    Returns rows: (user_id, revision_id, channel, address).
+    """
+    stale = (datetime.datetime.now() - datetime.timedelta(minutes=STALE_SENDING_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE notification_deliveries SET status = 'pending' WHERE status = 'sending' AND started_at < ?", (stale,))
+        rows = conn.execute("""
+            SELECT user_id, revision_id, channel, address FROM notification_deliveries
+            WHERE status = 'pending'
+            ORDER BY enqueued_at, revision_id
+            LIMIT ?
+        """, (limit,)).fetchall()
+        conn.executemany("""
+            UPDATE notification_deliveries SET status = 'sending', started_at = ?, attempts = attempts + 1
+            WHERE user_id = ? AND revision_id = ? AND channel = ?
+        """, [(_now(), r[0], r[1], r[2]) for r in rows])
+        conn.commit()
+        return [tuple(r) for r in rows]
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def mark_sent(conn, deliveries):
+    conn.executemany("""
+        UPDATE notification_deliveries SET status = 'sent', sent_at = ?
+        WHERE user_id = ? AND revision_id = ? AND channel = ?
+    """, [(_now(), d[0], d[1], d[2]) for d in deliveries])
+    conn.commit()
+
+def mark_failed(conn, deliveries, error):
+    """
+    Retries up to MAX_ATTEMPTS, then leaves the deliveries as failed.
+    """
+    conn.executemany("""
+        UPDATE notification_deliveries
+        SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, last_error = ?
+        WHERE user_id = ? AND revision_id = ? AND channel = ?
+    """, [(MAX_ATTEMPTS, str(error)[:200], d[0], d[1], d[2]) for d in deliveries])
+    conn.commit()
+
+def queue_stats(conn):
+    return {status: count for status, count in conn.execute(
+        "SELECT status, COUNT(*) FROM notification_deliveries GROUP BY status").fetchall()}
+
+def format_stats(stats):
+    return (f"pending={stats.get('pending', 0)} sending={stats.get('sending', 0)} "
+            f"sent={stats.get('sent', 0)} failed={stats.get('failed', 0)}")
@@ -0,0 +1,132 @@
+import time
+import datetime
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import get_db_connection
+import notification_queue
+from notification_queue import CHANNEL_LINE, CHANNEL_EMAIL
+from send_line import send_line_multicast
+from send_email import send_bulk_alert_email
+
+# Sender for the revision alerts queued by notification_queue.fan_out().
+# Deliveries are claimed in batches and grouped by (revision, channel), so one revision
+# watched by many users costs one LINE multicast per 500 users and one SMTP session.
+# Groups are sent concurrently; runs independently of the poller and the AI worker.
+BATCH_SIZE = 1000
+LINE_MULTICAST_LIMIT = 500
+SEND_WORKERS = 4
+IDLE_SLEEP = 1 # Alerts should go out within seconds of the disclosure
+STATS_INTERVAL = 300
+
+SITE_URL = "https://rich-investor-news.com"
+
+def render(revision):
+    """
+    Returns (subject, text) for a revisions row.
+    """
+    name = f"{revision['ticker']} {revision['company_name']}"
+    lines = [f"📢 【適時開示】{name}", revision['title'] or ""]
+    if revision['revision_rate_op'] is not None and revision['is_upward'] is not None:
+        arrow = "📈 上方修正" if revision['is_upward'] else "📉 下方修正"
+        lines.append(f"{arrow} (営業利益 {revision['revision_rate_op']:+.1f}%)")
+    if revision['ai_analyzed'] == 1 and revision['ai_summary']:
+        lines.append(f"💡 {revision['ai_summary']}")
+    lines.append(f"{SITE_URL}/revisions/{revision['id']}")
+    return f"【適時開示】{name}", "\n".join(lines)
+
+def send_group(channel, revision, deliveries):
+    """
+    Sends one revision to a group of deliveries. Returns (sent, failed) delivery lists.
+    """
+    subject, text = render(revision)
+    if channel == CHANNEL_LINE:
+        sent, failed = [], []
+        for i in range(0, len(deliveries), LINE_MULTICAST_LIMIT):
+            chunk = deliveries[i:i + LINE_MULTICAST_LIMIT]
+            if send_line_multicast([d[3] for d in chunk], text):
+                sent.extend(chunk)
+            else:
+                failed.extend(chunk)
+        return sent, failed
+
+    body = "<br>".join(text.split("\n"))
+    ok = set(send_bulk_alert_email([d[3] for d in deliveries], subject, body))
+    return [d for d in deliveries if d[3] in ok], [d for d in deliveries if d[3] not in ok]
+
+def process_batch(conn, pool):
+    """
+    Claims and sends one batch. Returns the number of claimed deliveries.
+    """
+    deliveries = notification_queue.claim_batch(conn, BATCH_SIZE)
+    if not deliveries:
+        return 0
+
+    groups = {}
+    for d in deliveries:
+        groups.setdefault((d[1], d[2]), []).append(d)
+
+    revision_ids = {revision_id for revision_id, _ in groups}
+    placeholders = ",".join("?" * len(revision_ids))
+    revisions = {r['id']: r for r in conn.execute(f"""
+        SELECT id, ticker, company_name, title, is_upward, revision_rate_op, ai_summary, ai_analyzed
+        FROM revisions WHERE id IN ({placeholders})
+    """, list(revision_ids)).fetchall()}
+
+    futures = []
+    for (revision_id, channel), group in groups.items():
+        revision = revisions.get(revision_id)
+        if not revision:
+            notification_queue.mark_failed(conn, group, "revision not found")
+            continue
+        futures.append((group, pool.submit(send_group, channel, revision, group)))
+
+    for group, fut in futures:
+        try:
+            sent, failed = fut.result()
+        except Exception as e:
+            sent, failed = [], group
+            print(f"[Notify] Send error: {e}")
+        if sent:
+            notification_queue.mark_sent(conn, sent)
+        if failed:
+            notification_queue.mark_failed(conn, failed, "send failed")
+
+    print(f"[Notify] Sent {len(deliveries)} deliveries for {len(revision_ids)} revisions.")
+    return len(deliveries)
+
+def run_worker():
+    print("Starting Notification Worker...")
+    pool = ThreadPoolExecutor(max_workers=SEND_WORKERS)
+    last_stats = 0
+    while True:
+        try:
+            conn = get_db_connection()
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                stats = notification_queue.format_stats(notification_queue.queue_stats(conn))
+                print(f"[Notify] {datetime.datetime.now().strftime('%H:%M:%S')} deliveries: {stats}")
+                last_stats = time.monotonic()
+            claimed = process_batch(conn, pool)
+            conn.close()
+            if claimed == 0:
+                time.sleep(IDLE_SLEEP)
+
+        except KeyboardInterrupt:
+            print("Stopping Notification Worker...")
+            break
+        except Exception as e:
+            print(f"Notification Worker Error: {e}")
+            time.sleep(60) # Sleep even on error to avoid rapid loop
+    pool.shutdown(wait=False)
+
+if __name__ == "__main__":
+    if "--stats" in sys.argv:
+        conn = get_db_connection()
+        print(notification_queue.format_stats(notification_queue.queue_stats(conn)))
+        conn.close()
+    else:
+        run_worker()
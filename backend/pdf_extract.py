@@ -0,0 +1,362 @@
+import re
+import unicodedata
+
+# Local extraction tier for revision PDFs (業績予想の修正 / 配当予想の修正).
+# Most notices use the standard TDnet table layout:
+#
+#                     売上高   営業利益   経常利益   当期純利益   1株当たり当期純利益
+#   前回発表予想(A)    10,000     1,000      1,100        700        35.00
+#   今回修正予想(B)    11,000     1,300      1,400        900        45.00
+#   増減額(B-A)         1,000       300        300        200
+#   増減率(%)            10.0      30.0       27.3       28.6
+#
+# The table is parsed from the PDF text into the same JSON shape as the Gemini prompt.
+# Results are only used when the numbers cross-check (増減額 / 増減率, dividend totals);
+# anything else falls back to the LLM.
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+MAX_PAGES = 5 # Revision notices are 1-3 pages
+
+# Column keywords, in match priority (IFRS / banks / J-GAAP wording)
+EARNINGS_COLUMNS = [
+    ('sales', re.compile(r'売上高|売上収益|営業収益|経常収益|営業総収入')),
+    ('op', re.compile(r'営業利益|事業利益')),
+    ('ordinary', re.compile(r'経常利益|税引前(?:当期)?利益|税金等調整前')),
+    ('net', re.compile(r'(?:当期|四半期|中間)?純利益|帰属する')),
+    ('eps', re.compile(r'1株当たり')),
+]
+DIVIDEND_COLUMNS = [
+    ('q1', re.compile(r'第1四半期末')),
+    ('q2', re.compile(r'第2四半期末|中間期末')),
+    ('q3', re.compile(r'第3四半期末')),
+    ('year_end', re.compile(r'(?<!四半)(?<!中間)期末')),
+    ('total', re.compile(r'合計|年間')),
+]
+
+ROW_LABELS = [
+    ('previous', re.compile(r'^(?:\(ご参考\))?前回(?:発表|公表)?予想')),
+    ('revised', re.compile(r'^今回(?:修正|発表)?予想|^修正後(?:予想)?')),
+    ('diff', re.compile(r'^増減額')),
+    ('rate', re.compile(r'^増減率')),
+    ('actual', re.compile(r'^当期実績')),
+    ('prior_actual', re.compile(r'^(?:\(ご参考\))?前期実績')),
+]
+LABEL_MARK_RE = re.compile(r'^\s*\([A-Z\-+%()]*\)\s*') # (A) (B) (B-A) (%)
+NUM_TOKEN_RE = re.compile(r'^[△▲]?-?\d{1,3}(?:,\d{3})+(?:\.\d+)?$|^[△▲]?-?\d+(?:\.\d+)?$')
+NULL_TOKEN_RE = re.compile(r'^[-―‐—–ー]{1,2}$')
+FISCAL_MONTH_RE = re.compile(r'\d{4}年(\d{1,2})月期')
+PERIOD_RE = re.compile(r'第([1-3])四半期|中間期|通期')
+
+def extract_text(pdf_path):
+    """
+    Returns the text of the first MAX_PAGES pages, or None if no PDF library is available / the PDF has no text layer.
+    """
+    pages = []
+    try:
+        if pdfplumber:
+            with pdfplumber.open(pdf_path) as pdf:
+                for page in pdf.pages[:MAX_PAGES]:
+                    pages.append(page.extract_text() or "")
+        elif pypdf:
+            reader = pypdf.PdfReader(pdf_path)
+            for page in reader.pages[:MAX_PAGES]:
+                pages.append(page.extract_text() or "")
+        else:
+            return None
+    except Exception as e:
+        print(f"  Local PDF extraction error: {e}")
+        return None
+
+    text = "\n".join(pages)
+    return text if text.strip() else None
+
+def normalize_line(line):
+    # NFKC: full-width digits/brackets/commas -> ASCII; keep △▲ for negatives
+    return unicodedata.normalize('NFKC', line).replace('－', '-').replace('−', '-').strip()
+
+def parse_number(token):
+    if NULL_TOKEN_RE.match(token):
+        return None
+    negative = token[0] in '△▲' or token.startswith('-')
+    value = float(token.lstrip('△▲-').replace(',', ''))
+    return -value if negative else value
+
+def split_row(line):
+    """
+    Returns (label_key, values) for a table row, or (None, None).
+    values are floats / None (for '-') in column order.
+    """
+    compact = line.replace(' ', '')
+    for key, pattern in ROW_LABELS:
+        m = pattern.match(compact)
+        if m:
+            # Cut the label off the spaced line: skip as many non-space chars as the label has
+            rest, consumed = line, 0
+            while consumed < m.end() and rest:
+                if rest[0] != ' ':
+                    consumed += 1
+                rest = rest[1:]
+            rest = LABEL_MARK_RE.sub('', rest)
+            return key, parse_values(rest)
+    return None, None
+
+def parse_values(text):
+    """
+    Returns the list of numeric / null tokens, or None if text has other words (not a number row).
+    Unit words (百万円, 円, 銭, %) are ignored.
+    """
+    values = []
+    for token in text.split():
+        if token in ('百万円', '千円', '円', '銭', '%', '円銭'):
+            continue
+        if NUM_TOKEN_RE.match(token) or NULL_TOKEN_RE.match(token):
+            values.append(parse_number(token))
+        else:
+            return None
+    return values
+
+def header_columns(text, columns):
+    """
+    Column keys in order of appearance in the header text.
+    """
+    found = []
+    for key, pattern in columns:
+        m = pattern.search(text)
+        if m:
+            found.append((m.start(), key))
+    return [key for _, key in sorted(found)]
+
+def header_kind(compact):
+    """
+    'earnings' / 'dividend' if the line looks like a column header (2+ column names), else None.
+    """
+    if '期末' in compact and len(header_columns(compact, DIVIDEND_COLUMNS)) >= 2:
+        return 'dividend'
+    if len(header_columns(compact, EARNINGS_COLUMNS)) >= 2:
+        return 'earnings'
+    return None
+
+def find_tables(lines):
+    """
+    Splits the document into tables: a header (column names, may span lines) followed by labelled rows.
+    Returns [{ kind: 'earnings'|'dividend', columns, rows: {label: values}, context, unit }]
+    """
+    tables = []
+    current = None
+    for i, line in enumerate(lines):
+        compact = line.replace(' ', '')
+        label, values = split_row(line)
+
+        if label:
+            if current is not None:
+                if values is not None and label not in current['rows']:
+                    current['rows'][label] = values
+                current['last_label'] = label
+            continue
+
+        kind = header_kind(compact)
+        if kind:
+            # New table (an earlier header-like sentence without rows is replaced)
+            if current is not None and not current['rows']:
+                tables.pop()
+            current = {
+                'kind': kind,
+                'header': compact,
+                'rows': {},
+                'context': " ".join(lines[max(0, i - 3):i]),
+                'unit': '単位: 百万円',
+                'last_label': None,
+            }
+            tables.append(current)
+        elif current is not None and not current['rows']:
+            # Header continued on the next line (e.g. 親会社株主に帰属する / 当期純利益)
+            current['header'] += compact
+        elif current is not None and current['last_label']:
+            # Numbers wrapped onto the next line of the previous row
+            values = parse_values(line)
+            if values:
+                row = current['rows'].setdefault(current['last_label'], [])
+                if len(row) < len(current['columns']):
+                    row.extend(values)
+                continue
+            current['last_label'] = None
+        else:
+            continue
+
+        columns = DIVIDEND_COLUMNS if current['kind'] == 'dividend' else EARNINGS_COLUMNS
+        current['columns'] = header_columns(current['header'], columns)
+        if '千円' in current['header']:
+            current['unit'] = '単位: 千円'
+    return [t for t in tables if t['columns'] and t['rows']]
+
+def row_dict(table, label):
+    values = table['rows'].get(label)
+    if values is None or len(values) != len(table['columns']):
+        return None
+    return dict(zip(table['columns'], values))
+
+def period_of(table, title=""):
+    m = PERIOD_RE.search(table['context']) or PERIOD_RE.search(title or "")
+    if not m:
+        return None
+    if m.group(0) == '通期':
+        return '通期'
+    if m.group(0) == '中間期':
+        return '第2四半期'
+    return f"第{m.group(1)}四半期"
+
+def check_earnings(table):
+    """
+    Returns (previous, revised, confident) for an earnings table.
+    Confident only if 営業利益 is present in both rows and matches 増減額 or 増減率.
+    """
+    prev = row_dict(table, 'previous')
+    rev = row_dict(table, 'revised')
+    if not prev or not rev or 'op' not in table['columns']:
+        return prev, rev, False
+    if prev['op'] is None or rev['op'] is None:
+        return prev, rev, False
+
+    checks = []
+    diff_values = table['rows'].get('diff') or []
+    diff = dict(zip(table['columns'], diff_values))
+    if diff.get('op') is not None:
+        checks.append(abs((rev['op'] - prev['op']) - diff['op']) <= 1)
+    rate_values = table['rows'].get('rate') or []
+    rate = dict(zip(table['columns'], rate_values))
+    if rate.get('op') is not None and prev['op'] > 0:
+        checks.append(abs((rev['op'] - prev['op']) / prev['op'] * 100 - rate['op']) <= 0.2)
+    return prev, rev, bool(checks) and all(checks)
+
+def check_dividend(table):
+    """
+    Returns (dividend dict, confident) for a dividend table.
+    """
+    rev = row_dict(table, 'revised')
+    if not rev or rev.get('total') is None:
+        return None, False
+
+    # Compare with the previous forecast, or last year's actual if there was none
+    base = row_dict(table, 'previous')
+    if not base or base.get('total') is None:
+        base = row_dict(table, 'prior_actual')
+    if not base or base.get('total') is None:
+        return None, False
+
+    # Totals must equal the sum of the per-period values (when all periods are listed)
+    confident = True
+    actual = row_dict(table, 'actual') or {}
+    parts = [rev.get(k) if rev.get(k) is not None else actual.get(k)
+             for k in table['columns'] if k != 'total']
+    if parts and all(p is not None for p in parts):
+        confident = abs(sum(parts) - rev['total']) < 0.01
+
+    return {
+        "annual_forecast": rev['total'],
+        "is_hike": rev['total'] > base['total'],
+        "rights_month": None,
+        "payment_month": None,
+    }, confident
+
+def format_amount(value, unit):
+    if value is None:
+        return "-"
+    text = f"{value:,.0f}" if float(value).is_integer() else f"{value:,.1f}"
+    return text + ('千円' if '千円' in unit else '百万円')
+
+def extract_revision(text, title=""):
+    """
+    Parses a revision notice.
+    Returns (result, confident): result has the Gemini JSON shape
+    (is_upward, revision_rate_op, summary, quarter, dividend, forecast_data).
+    """
+    lines = [normalize_line(l) for l in text.splitlines()]
+    lines = [l for l in lines if l]
+    tables = find_tables(lines)
+
+    earnings = [t for t in tables if t['kind'] == 'earnings']
+    dividends = [t for t in tables if t['kind'] == 'dividend']
+    has_dividend_revision = '配当' in (title or '')
+    if not earnings and not dividends:
+        return None, False
+
+    result = {
+        "is_upward": None,
+        "revision_rate_op": 0.0,
+        "summary": None,
+        "quarter": None,
+        "dividend": None,
+        "forecast_data": None,
+    }
+    confident = True
+
+    if earnings:
+        # Prefer the full-year table when the notice has several periods
+        table = next((t for t in earnings if period_of(t) == '通期'), earnings[-1])
+        prev, rev, ok = check_earnings(table)
+        confident = confident and ok
+        if prev and rev:
+            main = ['sales', 'op', 'ordinary', 'net']
+            result['forecast_data'] = {
+                "previous": {k: prev.get(k) for k in main},
+                "revised": {k: rev.get(k) for k in main},
+                "unit": table['unit'],
+            }
+            result['quarter'] = period_of(table, title) or '通期'
+            if prev.get('op') is not None and rev.get('op') is not None:
+                result['is_upward'] = rev['op'] > prev['op']
+                if prev['op'] > 0:
+                    result['revision_rate_op'] = round((rev['op'] - prev['op']) / prev['op'] * 100, 1)
+                result['summary'] = (
+                    f"{result['quarter']}営業利益予想を{format_amount(prev['op'], table['unit'])}から"
+                    f"{format_amount(rev['op'], table['unit'])}に"
+                    f"{'上方' if result['is_upward'] else '下方' if rev['op'] < prev['op'] else ''}修正"
+                )
+                if result['revision_rate_op']:
+                    result['summary'] += f"（{result['revision_rate_op']:+.1f}%）"
+
+    if dividends:
+        dividend, ok = check_dividend(dividends[-1])
+        confident = confident and ok
+        if dividend:
+            m = FISCAL_MONTH_RE.search(text)
+            dividend['rights_month'] = int(m.group(1)) if m else None
+            result['dividend'] = dividend
+            div_text = f"年間配当予想を{dividend['annual_forecast']:g}円に{'増配' if dividend['is_hike'] else '修正'}"
+            if result['is_upward'] is None:
+                # No operating profit revision: the verdict follows the dividend
+                result['is_upward'] = dividend['is_hike']
+                result['quarter'] = result['quarter'] or '通期'
+                result['summary'] = div_text
+            else:
+                result['summary'] += f"、{div_text}"
+    elif has_dividend_revision:
+        # Dividend notice whose table we could not read
+        confident = False
+
+    if result['is_upward'] is None or not result['summary']:
+        confident = False
+    return result, confident
+
+def analyze_locally(pdf_path, title=""):
+    """
+    Returns a confident local result, or None (caller falls back to the LLM).
+    """
+    text = extract_text(pdf_path)
+    if not text:
+        return None
+    try:
+        result, confident = extract_revision(text, title)
+    except Exception as e:
+        print(f"  Local parse error: {e}")
+        return None
+    return result if confident else None
@@ -0,0 +1,119 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+
+# Disclosure PDF prefetch stage for the AI analysis.
+# Upcoming PDFs are downloaded concurrently into a bounded cache directory
+# (keyed by sha256(url), TDnet PDF URLs never change), so the analyzer always
+# finds its input on disk and the download overlaps with the rate-limit wait.
+# Retries and re-analysis reuse the cached file. LRU eviction by total size.
+
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pdf_cache'))
+MAX_PDF_CACHE_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 300 * 1024 * 1024))
+PREFETCH_WORKERS = 4 # Still paced by http_client's per-host limits
+DOWNLOAD_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+PDF_HEADER_WINDOW = 1024 # "%PDF-" may follow a few junk bytes
+
+def cache_path(url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(PDF_CACHE_DIR, key[:2], key + '.pdf')
+
+def _evict():
+    """
+    Deletes least recently used PDFs until the cache is at 90% of MAX_PDF_CACHE_BYTES.
+    """
+    files = []
+    for root, _, names in os.walk(PDF_CACHE_DIR):
+        for name in names:
+            if name.endswith('.pdf'):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    if total <= MAX_PDF_CACHE_BYTES:
+        return
+    target = MAX_PDF_CACHE_BYTES * 0.9
+    for _, size, path in sorted(files):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def download_pdf(url):
+    """
+    Returns the local path of the PDF (downloading it if needed), or None if the download failed.
+    """
+    path = cache_path(url)
+    if os.path.exists(path):
+        try:
+            os.utime(path) # LRU: mark as recently used
+        except OSError:
+            pass
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        res = http_client.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        try:
+            if res.status_code != 200:
+                print(f"  Download failed: {res.status_code} {url}")
+                return None
+            head = b''
+            with open(tmp_path, 'wb') as f:
+                for chunk in res.iter_content(CHUNK_SIZE):
+                    if len(head) < PDF_HEADER_WINDOW:
+                        head += chunk[:PDF_HEADER_WINDOW - len(head)]
+                    f.write(chunk)
+        finally:
+            res.close()
+        # Error / maintenance pages served with 200 must not be cached as the disclosure's PDF
+        if b'%PDF' not in head:
+            print(f"  Download failed: not a PDF ({res.headers.get('Content-Type', 'no Content-Type')}) {url}")
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"  Download error: {e} {url}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    _evict()
+    return path
+
+class PdfPrefetcher:
+    """
+    prefetch(urls) starts background downloads; get(url) returns the local path,
+    waiting for an in-flight download or downloading synchronously if it was never prefetched.
+    """
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def prefetch(self, urls):
+        with self.lock:
+            for url in urls:
+                if url and url not in self.futures:
+                    self.futures[url] = self.pool.submit(download_pdf, url)
+
+    def get(self, url):
+        with self.lock:
+            fut = self.futures.pop(url, None)
+        if fut is None:
+            return download_pdf(url)
+        return fut.result()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -8,21 +8,65 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from fetch_tdnet import fetch_tdnet_revisions
 
+try:
+    import jpholiday # Optional: Japanese national holidays
+except ImportError:
+    jpholiday = None
+
+# Adaptive polling intervals (seconds)
+# TDnet updates mostly 15:00-17:00 but sometimes 08:30 / 11:30, and a few late-evening filings.
+PEAK_INTERVAL = 10 # Weekdays 15:00-17:00
+MARKET_INTERVAL = 60 # Weekdays 07:30-15:00, 17:00-20:00
+OFF_HOURS_INTERVAL = 600 # Weekday nights
+CLOSED_INTERVAL = 1800 # Weekends, holidays, year-end closure
+
+def is_market_day(d):
+    if d.weekday() >= 5:
+        return False
+    # TSE year-end/new-year closure (12/31 - 1/3)
+    if (d.month == 12 and d.day == 31) or (d.month == 1 and d.day <= 3):
+        return False
+    if jpholiday and jpholiday.is_holiday(d):
+        return False
+    return True
+
+WINDOW_BOUNDARIES = [datetime.time(7, 30), datetime.time(15, 0), datetime.time(17, 0), datetime.time(20, 0)]
+
+def base_interval(now):
+    if not is_market_day(now.date()):
+        return CLOSED_INTERVAL
+
+    t = now.time()
+    if datetime.time(15, 0) <= t < datetime.time(17, 0):
+        return PEAK_INTERVAL
+    if datetime.time(7, 30) <= t < datetime.time(20, 0):
+        return MARKET_INTERVAL
+    return OFF_HOURS_INTERVAL
+
+def next_interval(now):
+    """
+    Interval for the current window, cut short so we wake up when the next window starts.
+    """
+    boundaries = [datetime.datetime.combine(now.date(), b) for b in WINDOW_BOUNDARIES]
+    boundaries.append(datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(0, 0)))
+    next_boundary = min(b for b in boundaries if b > now)
+    until_boundary = int((next_boundary - now).total_seconds()) + 1
+    return min(base_interval(now), until_boundary)
+
 def poll_tdnet():
-    print("Starting TDnet Polling Service (Interval: 60s)...")
+    print("Starting TDnet Polling Service (adaptive interval)...")
     while True:
         try:
             now = datetime.datetime.now()
-            # Only poll during market hours + buffer (8:00 - 18:00) 
-            # or just always 24/7? TDnet updates mostly 15:00-17:00 but sometimes 08:30.
-            # Let's run 24/7 to be safe and catch everything.
-            
+
             print(f"\n[Poller] checking at {now.strftime('%H:%M:%S')}...")
-            fetch_tdnet_revisions()
-            
-            print("[Poller] detailed check complete. Sleeping 60s.")
-            time.sleep(60)
-            
+            fetch_tdnet_revisions() # Incremental: only rows newer than today's watermark
+
+            interval = next_interval(datetime.datetime.now())
+
+            print(f"[Poller] detailed check complete. Sleeping {interval}s.")
+            time.sleep(interval)
+
         except KeyboardInterrupt:
             print("Stopping Poller...")
             break
@@ -2,9 +2,9 @@ import sqlite3
 import time
 import os
 from database import get_db_connection
-from analyze_revisions_ai import analyze_revision_pdf
-import requests
-import tempfile
+from analyze_revisions_ai import analyze_pdf, format_analysis_stats
+from llm_scheduler import LANE_BACKGROUND
+from pdf_prefetch import PdfPrefetcher
 import json # Import json to handle encoding
 
 def process_backlog(limit=50):
@@ -33,6 +33,10 @@ def process_backlog(limit=50):
 
     print(f"Found {len(rows)} backlog items. Starting AI Analysis...")
     
+    # Download all PDFs in the background; each analysis finds its input on disk
+    prefetcher = PdfPrefetcher()
+    prefetcher.prefetch([row['source_url'] for row in rows])
+    
     for row in rows:
         rev_id = row['id']
         url = row['source_url']
@@ -42,21 +46,15 @@ def process_backlog(limit=50):
         print(f"\n[Backlog] Processing {ticker} ({rev_id}): {title}")
         
         try:
-            # Download
-            res = requests.get(url, timeout=15)
-            if res.status_code != 200:
-                print(f"  Download failed: {res.status_code}")
+            # Download (usually already prefetched)
+            pdf_path = prefetcher.get(url)
+            if not pdf_path:
                 c.execute("UPDATE revisions SET ai_analyzed = 2 WHERE id = ?", (rev_id,))
                 conn.commit()
                 continue
                 
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-                tmp.write(res.content)
-                tmp_path = tmp.name
-                
-            # Analyze
-            result = analyze_revision_pdf(tmp_path, title)
-            os.remove(tmp_path)
+            # Analyze (Gemini calls are paced by llm_scheduler; the backlog lane yields to live TDnet items)
+            result, source = analyze_pdf(pdf_path, title, lane=LANE_BACKGROUND)
             
             if result:
                 is_upward = result.get('is_upward') 
@@ -90,17 +88,16 @@ def process_backlog(limit=50):
                 c.execute("UPDATE revisions SET ai_analyzed = 2 WHERE id = ?", (rev_id,))
                 conn.commit()
                 
-            # Respect Rate Limit (Gemini Free Tier is ~15 RPM, so 4s delay is min, go 10s to be safe)
-            time.sleep(10)
-            
         except Exception as e:
             if "QUOTA" in str(e).upper():
-                print("!!! QUOTA EXCEEDED !!! Stopping backlog process.")
+                # Leave the row at ai_analyzed=3; the next batch waits for the shared quota
+                print("!!! QUOTA EXCEEDED !!! Stopping backlog batch.")
                 break
             print(f"  Error: {e}")
             
+    prefetcher.close()
     conn.close()
-    print("Backlog batch completed.")
+    print(f"Backlog batch completed. {format_analysis_stats()}")
 
 if __name__ == "__main__":
     # Loop until stopped or empty
@@ -0,0 +1,90 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    rate: tokens refilled per second, capacity: max burst.
+    acquire() blocks until a token is available (replaces fixed time.sleep calls).
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+def get_host(url):
+    try:
+        return (urlparse(url).hostname or '').lower()
+    except Exception:
+        return ''
+
+class DomainLimiter:
+    """
+    Per-host politeness: caps concurrent requests per host (semaphore)
+    and paces them with a per-host token bucket.
+    overrides: { "host": (max_concurrent, rate_per_sec) } for hosts that need special treatment.
+    A "host/path-prefix" key gives those URLs their own, separate bucket.
+    """
+    def __init__(self, max_per_domain=2, rate_per_domain=1.0, overrides=None):
+        self.max_per_domain = max_per_domain
+        self.rate_per_domain = rate_per_domain
+        self.overrides = overrides or {}
+        # Longest prefix first
+        self.path_keys = sorted((k for k in self.overrides if '/' in k), key=len, reverse=True)
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.buckets = {}
+
+    def limit_key(self, url):
+        host = get_host(url)
+        if self.path_keys:
+            try:
+                target = host + (urlparse(url).path or '/')
+            except Exception:
+                return host
+            for key in self.path_keys:
+                if target.startswith(key):
+                    return key
+        return host
+
+    def _get(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                max_conc, rate = self.overrides.get(host, (self.max_per_domain, self.rate_per_domain))
+                self.semaphores[host] = threading.Semaphore(max_conc)
+                self.buckets[host] = TokenBucket(rate, capacity=max_conc)
+            return self.semaphores[host], self.buckets[host]
+
+    @contextmanager
+    def slot(self, url):
+        sem, bucket = self._get(self.limit_key(url))
+        with sem:
+            bucket.acquire()
+            yield
@@ -37,6 +37,40 @@ def send_alert_email(to_email, subject, body_html):
         traceback.print_exc()
         return False
 
+def send_bulk_alert_email(to_emails, subject, body_html):
+    """
+    Sends the same alert to each address over a single SMTP session.
+    Returns the list of addresses that were sent.
+    """
+    if not SENDER_EMAIL or not SENDER_PASSWORD:
+        print("Skipping email: SENDER_EMAIL or SENDER_PASSWORD not set.")
+        return []
+
+    sent = []
+    try:
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+        server.starttls()
+        server.login(SENDER_EMAIL, SENDER_PASSWORD)
+        try:
+            for to_email in to_emails:
+                msg = MIMEMultipart()
+                msg['From'] = f"Investor News <{SENDER_EMAIL}>"
+                msg['To'] = to_email
+                msg['Subject'] = subject
+                msg.attach(MIMEText(body_html, 'html'))
+                try:
+                    server.sendmail(SENDER_EMAIL, to_email, msg.as_string())
+                    sent.append(to_email)
+                except smtplib.SMTPRecipientsRefused as e:
+                    print(f"Failed to send email to {to_email}: {e}")
+        finally:
+            server.quit()
+        print(f"Email sent to {len(sent)}/{len(to_emails)} recipients")
+    except Exception as e:
+        print(f"Failed to send bulk email: {e}")
+        traceback.print_exc()
+    return sent
+
 if __name__ == "__main__":
     # Test
     pass
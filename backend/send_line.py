@@ -80,6 +80,40 @@ def send_line_push(line_user_id, message):
     except Exception as e:
         print(f"Error sending LINE Push: {e}")
 
+def send_line_multicast(line_user_ids, message):
+    """
+    Sends the same push message to up to 500 users in one request.
+    Returns True if LINE accepted it.
+    """
+    line_user_ids = [u for u in line_user_ids if u]
+    if not line_user_ids:
+        return True
+        
+    url = "https://api.line.me/v2/bot/message/multicast"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {LINE_ACCESS_TOKEN}"
+    }
+    data = {
+        "to": line_user_ids[:500], # API limit
+        "messages": [
+            {
+                "type": "text",
+                "text": message
+            }
+        ]
+    }
+    
+    try:
+        res = requests.post(url, headers=headers, data=json.dumps(data), timeout=30)
+        if res.status_code == 200:
+            print(f"LINE Multicast sent to {len(data['to'])} users!")
+            return True
+        print(f"Failed to send LINE Multicast: {res.status_code} {res.text}")
+    except Exception as e:
+        print(f"Error sending LINE Multicast: {e}")
+    return False
+
 if __name__ == "__main__":
     # Test
     if not LINE_ACCESS_TOKEN:
@@ -0,0 +1,106 @@
+import json
+import datetime
+from fingerprint import normalize_text, shingles, hash64, to_signed64
+
+# Cross-investor story clustering.
+# Each article gets a MinHash signature of its title shingles (the only text both the RSS
+# entry and a stored news_items row have, see migrate_news_stories.py); LSH buckets
+# (BANDS x ROWS) find candidate stories, which are confirmed by estimated Jaccard similarity.
+# Investors are linked to stories many-to-many via story_investors.
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS # 4 rows -> LSH threshold ~ (1/8)^(1/4) = 0.59
+SIMILARITY_THRESHOLD = 0.6
+LOOKBACK_DAYS = 7 # Only recent stories are kept in the in-memory index
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (hash64(f"a{i}") % (_MERSENNE_PRIME - 1) + 1, hash64(f"b{i}") % _MERSENNE_PRIME)
+    for i in range(NUM_PERM)
+]
+
+def minhash_signature(title, text=""):
+    """
+    Returns a NUM_PERM-long MinHash signature (list of ints), or None for empty text.
+    """
+    shingle_set = shingles(normalize_text(f"{title or ''} {text or ''}"))
+    if not shingle_set:
+        return None
+    base_hashes = [hash64(s) % _MERSENNE_PRIME for s in shingle_set]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in base_hashes) for a, b in _PERMUTATIONS]
+
+def estimate_similarity(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+def lsh_keys(sig):
+    return [(band, to_signed64(hash64(json.dumps(sig[band * ROWS:(band + 1) * ROWS])))) for band in range(BANDS)]
+
+class StoryIndex:
+    """
+    In-memory LSH index over recent stories (rebuilt from news_stories each run).
+    """
+    def __init__(self, conn=None, lookback_days=LOOKBACK_DAYS):
+        self.buckets = {}
+        self.signatures = {}
+        if conn is not None:
+            since = (datetime.datetime.now() - datetime.timedelta(days=lookback_days)).strftime('%Y-%m-%d %H:%M:%S')
+            rows = conn.execute("""
+                SELECT id, signature FROM news_stories
+                WHERE created_at > ? AND canonical_news_id IS NOT NULL AND signature IS NOT NULL
+            """, (since,)).fetchall()
+            for story_id, signature in rows:
+                self.add(story_id, json.loads(signature))
+
+    def add(self, story_id, sig):
+        self.signatures[story_id] = sig
+        for key in lsh_keys(sig):
+            self.buckets.setdefault(key, set()).add(story_id)
+
+    def remove(self, story_id):
+        sig = self.signatures.pop(story_id, None)
+        if sig:
+            for key in lsh_keys(sig):
+                self.buckets.get(key, set()).discard(story_id)
+
+    def find(self, sig):
+        """
+        Returns the id of the most similar story above SIMILARITY_THRESHOLD, or None.
+        """
+        candidates = set()
+        for key in lsh_keys(sig):
+            candidates |= self.buckets.get(key, set())
+
+        best_id, best_sim = None, SIMILARITY_THRESHOLD
+        for story_id in candidates:
+            sim = estimate_similarity(sig, self.signatures[story_id])
+            if sim >= best_sim:
+                best_id, best_sim = story_id, sim
+        return best_id
+
+def create_story(conn, title, sig):
+    c = conn.execute("INSERT INTO news_stories (title, signature) VALUES (?, ?)", (title, json.dumps(sig)))
+    return c.lastrowid
+
+def delete_story(conn, story_id):
+    """
+    Removes a story that never got a stored article (its leader's extraction failed).
+    """
+    conn.execute("DELETE FROM story_investors WHERE story_id = ?", (story_id,))
+    conn.execute("DELETE FROM news_stories WHERE id = ? AND canonical_news_id IS NULL", (story_id,))
+
+def link_investors(conn, links):
+    """
+    links: iterable of (story_id, investor_id)
+    """
+    conn.executemany("INSERT OR IGNORE INTO story_investors (story_id, investor_id) VALUES (?, ?)", list(links))
+
+def set_canonical_items(conn, story_urls):
+    """
+    story_urls: iterable of (story_id, url) for the first stored article of each story.
+    """
+    conn.executemany("""
+        UPDATE news_stories
+        SET canonical_news_id = (SELECT id FROM news_items WHERE url = ?)
+        WHERE id = ? AND canonical_news_id IS NULL
+    """, [(url, story_id) for story_id, url in story_urls])
@@ -2,70 +2,217 @@ import google.generativeai as genai
 import sqlite3
 import os
 import time
-from datetime import datetime, timedelta
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from llm_scheduler import gemini_flash, LANE_BACKGROUND
+from summary_cache import SummaryCache, MAX_DISTANCE, MIN_TEXT_CHARS
+from fingerprint import article_fingerprint, hamming
 
 # Config using environment variables
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend', 'investor_news.db')
 
+# Queue / batching settings
+BATCH_SIZE = 10 # Articles per prompt
+MAX_ATTEMPTS = 3 # After this, the queue row is marked 'failed'
+MAX_CONCURRENCY = 2 # Parallel batch requests
+MAX_INPUT_CHARS = 2000 # Per article
+
+_model = None
+_model_lock = threading.Lock()
+
+# Reuse one-line summaries across syndicated copies of the same story
+AI_SUMMARY_CACHE = SummaryCache('ai_summary', db_path=DB_PATH)
+
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
-def summarize_text(text):
+def get_model():
+    """
+    Returns the shared GenerativeModel (configured once per process).
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            genai.configure(api_key=GEMINI_API_KEY)
+            _model = genai.GenerativeModel('gemini-1.5-flash')
+        return _model
+
+def estimate_tokens(text):
+    # Japanese is roughly 1 token per character; over-estimate to stay under TPM
+    return len(text) + 50
+
+def summarize_batch(items):
+    """
+    Summarizes several articles in one request.
+    items: [{ "id": int, "text": str }]
+    Returns { id: summary } (items missing from the response are omitted).
+    """
+    articles = "\n".join(
+        json.dumps({"id": it['id'], "text": it['text'][:MAX_INPUT_CHARS]}, ensure_ascii=False)
+        for it in items
+    )
+    prompt = f"""
+    あなたはプロの金融アナリストです。
+    以下の各ニュース記事（1行に1件のJSON）について、個人投資家にとって重要なポイントに絞って、30文字〜50文字程度の「ひとこと要約」を作成してください。
+    主観は入れず、事実のみを簡潔に伝えてください。
+
+    Output Format (JSON array only, 入力と同じ id を使うこと):
+    [{{"id": 123, "summary": "..."}}]
+
+    記事:
+    {articles}
+    """
+
+    response = gemini_flash.call(
+        lambda: get_model().generate_content(
+            prompt,
+            generation_config={"response_mime_type": "application/json"}
+        ),
+        lane=LANE_BACKGROUND,
+        tokens=estimate_tokens(prompt)
+    )
+
+    text = response.text
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0]
+
+    results = {}
+    for entry in json.loads(text.strip()):
+        try:
+            summary = str(entry['summary']).replace('\n', '').strip()
+            if summary:
+                results[int(entry['id'])] = summary
+        except (KeyError, TypeError, ValueError):
+            continue
+    return results
+
+def enqueue_pending(conn):
+    """
+    Adds every news item without an AI summary to the queue (no age limit).
+    """
+    c = conn.cursor()
+    c.execute("""
+        INSERT OR IGNORE INTO summary_queue (news_id)
+        SELECT id FROM news_items WHERE ai_summary IS NULL OR ai_summary = ''
+    """)
+    conn.commit()
+    return c.rowcount
+
+def next_batches(conn, max_batches):
+    rows = conn.execute("""
+        SELECT q.news_id, n.title, n.summary
+        FROM summary_queue q
+        JOIN news_items n ON n.id = q.news_id
+        WHERE q.status = 'pending'
+        ORDER BY q.enqueued_at, q.news_id
+        LIMIT ?
+    """, (BATCH_SIZE * max_batches,)).fetchall()
+
+    # Use existing summary or title as input
+    items = [{"id": r['news_id'], "text": r['summary'] or r['title'], "title": r['title']} for r in rows]
+    return [items[i:i+BATCH_SIZE] for i in range(0, len(items), BATCH_SIZE)]
+
+def record_results(conn, batch, results, error=None):
+    """
+    Saves summaries and updates queue state (main thread only).
+    """
+    done = [(results[it['id']], it['id']) for it in batch if it['id'] in results]
+    missed = [it['id'] for it in batch if it['id'] not in results]
+
+    for it in batch:
+        if it['id'] in results and not it.get('cached'):
+            AI_SUMMARY_CACHE.store(it['title'], it['text'], results[it['id']])
+
+    with conn:
+        conn.executemany("UPDATE news_items SET ai_summary = ? WHERE id = ?", done)
+        conn.executemany("UPDATE summary_queue SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE news_id = ?",
+                         [(news_id,) for _, news_id in done])
+        conn.executemany("""
+            UPDATE summary_queue
+            SET attempts = attempts + 1,
+                last_error = ?,
+                status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE news_id = ?
+        """, [(error or 'missing from response', MAX_ATTEMPTS, news_id) for news_id in missed])
+
+    for summary, news_id in done:
+        print(f" -> [{news_id}] {summary}")
+    return len(done)
+
+def process_news(max_batches=20):
+    """
+    Drains the summary queue: BATCH_SIZE articles per request, up to MAX_CONCURRENCY
+    requests in flight, paced by the shared Gemini quota (llm_scheduler).
+    """
+    print(f"[{datetime.now()}] Starting AI summarization...")
     if not GEMINI_API_KEY:
         print("Skipping AI summary: GEMINI_API_KEY not set.")
-        return None
-
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-1.5-flash') 
-
-        prompt = f"""
-        あなたはプロの金融アナリストです。
-        以下のニュース記事を、個人投資家にとって重要なポイントに絞って、30文字〜50文字程度の「ひとこと要約」を作成してください。
-        主観は入れず、事実のみを簡潔に伝えてください。
-        
-        記事:
-        {text[:2000]} 
-        """
-
-        response = model.generate_content(prompt)
-        return response.text.replace('\n', '').strip()
-    except Exception as e:
-        print(f"AI Summary Failed: {e}")
-        return None
-
-def process_news():
-    print(f"[{datetime.now()}] Starting AI summarization...")
+        return
+
+    started = time.monotonic()
     conn = get_db_connection()
-    c = conn.cursor()
+    added = enqueue_pending(conn)
+    batches = next_batches(conn, max_batches)
+    print(f"Queued {added} new items. Processing {sum(len(b) for b in batches)} items in {len(batches)} batches.")
+
+    total_done = 0
+
+    # Near-duplicates are served from the cache, or share one request with
+    # an earlier item of this run (the "leader")
+    leaders = [] # (simhash, item)
+    followers = {} # leader id -> [item, ...]
+    cached = {}
+    for batch in batches:
+        for it in batch:
+            summary = AI_SUMMARY_CACHE.lookup(it['title'], it['text'])
+            if summary:
+                it['cached'] = True
+                cached[it['id']] = summary
+                continue
+            norm, fp = article_fingerprint(it['title'], it['text'])
+            if len(norm) >= MIN_TEXT_CHARS:
+                leader = next((l for lfp, l in leaders if hamming(fp, lfp) <= MAX_DISTANCE), None)
+                if leader:
+                    it['cached'] = True
+                    followers.setdefault(leader['id'], []).append(it)
+                    continue
+                leaders.append((fp, it))
+    if cached:
+        total_done += record_results(conn, [it for b in batches for it in b if it['id'] in cached], cached)
+    batches = [[it for it in batch if not it.get('cached')] for batch in batches]
+    batches = [batch for batch in batches if batch]
+    dup_count = sum(len(v) for v in followers.values())
 
-    # Get recent news without summary
-    one_day_ago = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Selecting news created recently
-    c.execute("SELECT id, title, summary, url FROM news_items WHERE created_at > ? AND (ai_summary IS NULL OR ai_summary = '') LIMIT 20", (one_day_ago,))
-    news_items = c.fetchall()
-
-    print(f"Found {len(news_items)} items to summarize.")
-
-    for item in news_items:
-        original_summary = item['summary'] or item['title']
-        print(f"Summarizing: {item['title'][:20]}...")
-        
-        # Use existing summary or title as input
-        ai_summary = summarize_text(original_summary)
-        
-        if ai_summary:
-            print(f" -> Result: {ai_summary}")
-            c.execute("UPDATE news_items SET ai_summary = ? WHERE id = ?", (ai_summary, item['id']))
-            conn.commit()
-            time.sleep(1) # Rate limit politeness
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+        futures = [(batch, pool.submit(summarize_batch, batch)) for batch in batches]
+        for batch, fut in futures:
+            try:
+                results = fut.result()
+                error = None
+            except Exception as e:
+                print(f"AI Summary Batch Failed: {e}")
+                results, error = {}, str(e)[:200]
+            
+            # Copy each leader's result to its duplicates
+            dups = []
+            for it in batch:
+                for f in followers.get(it['id'], []):
+                    dups.append(f)
+                    if it['id'] in results:
+                        results[f['id']] = results[it['id']]
+            total_done += record_results(conn, batch + dups, results, error)
 
     conn.close()
-    print("AI summarization complete.")
+    print(f"AI summarization complete. {total_done} summaries in {time.monotonic() - started:.1f}s.")
+    print(f"{AI_SUMMARY_CACHE.stats()}, {dup_count} in-run duplicates")
 
 if __name__ == "__main__":
     process_news()
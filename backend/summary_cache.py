@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+from database import DB_NAME
+from fingerprint import article_fingerprint, simhash_bands, hamming, to_signed64, to_unsigned64
+
+# Near-duplicate summary cache.
+# Syndicated copies of a story (Google News redirects, partner sites, other investors' queries)
+# share a SimHash within a few bits, so their summary is reused instead of calling the LLM again.
+
+MAX_DISTANCE = 3 # Hamming distance on 64-bit SimHash
+MIN_TEXT_CHARS = 30 # Titles alone are too short to fingerprint reliably
+
+class SummaryCache:
+    """
+    kind separates summary styles (e.g. 'news_llm' from fetch_news, 'ai_summary' from summarize_news).
+    Safe to use from worker threads (own connection + lock).
+    """
+    def __init__(self, kind, db_path=DB_NAME, max_distance=MAX_DISTANCE):
+        self.kind = kind
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_conn(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self.conn
+
+    def lookup(self, title, text):
+        """
+        Returns a cached summary for a near-duplicate article, or None.
+        """
+        norm, fp = article_fingerprint(title, text)
+        if len(norm) < MIN_TEXT_CHARS:
+            return None
+
+        b = simhash_bands(fp)
+        with self.lock:
+            conn = self._get_conn()
+            rows = conn.execute("""
+                SELECT id, simhash, summary FROM summary_cache
+                WHERE kind = ? AND (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)
+            """, (self.kind, b[0], b[1], b[2], b[3])).fetchall()
+
+            best = None
+            for row_id, stored, summary in rows:
+                dist = hamming(fp, to_unsigned64(stored))
+                if dist <= self.max_distance and (best is None or dist < best[0]):
+                    best = (dist, row_id, summary)
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            conn.execute("UPDATE summary_cache SET hits = hits + 1, last_hit_at = CURRENT_TIMESTAMP WHERE id = ?", (best[1],))
+            conn.commit()
+            return best[2]
+
+    def store(self, title, text, summary):
+        if not summary:
+            return
+        norm, fp = article_fingerprint(title, text)
+        if len(norm) < MIN_TEXT_CHARS:
+            return
+
+        b = simhash_bands(fp)
+        with self.lock:
+            conn = self._get_conn()
+            conn.execute("""
+                INSERT INTO summary_cache (kind, simhash, band0, band1, band2, band3, summary)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (self.kind, to_signed64(fp), b[0], b[1], b[2], b[3], summary))
+            conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        return f"summary cache [{self.kind}]: {self.hits}/{total} hits ({rate:.0f}%)"
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,148 @@
+import re
+from dataclasses import dataclass, field
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from matcher import KeywordMatcher, load_keywords
+
+# TDnet daily listing parser (I_list_NNN_YYYYMMDD.html), shared by the live poller and the backfill.
+# - Finds the main list table once and maps columns by header text / cell class
+#   instead of fixed positions
+# - Emits typed Disclosure records
+# - Classifies titles into categories with one compiled keyword matcher
+#   (overridable via keywords.json "tdnet_categories")
+
+TDNET_BASE_URL = "https://www.release.tdnet.info/inbs/"
+# Busy days are split into I_list_001, I_list_002, ... (page, YYYYMMDD)
+TDNET_PAGE_URL = TDNET_BASE_URL + "I_list_{:03d}_{}.html"
+
+# Header text -> field (prefix match)
+HEADER_FIELDS = [
+    ('時刻', 'time'),
+    ('コード', 'code'),
+    ('会社名', 'name'),
+    ('表題', 'title'),
+    ('XBRL', 'xbrl'),
+    ('上場取引所', 'exchange'),
+    ('更新履歴', 'history'),
+]
+# TDnet cell classes (e.g. <td class="oddnew-M kjCode">) -> field
+CLASS_FIELDS = {
+    'kjTime': 'time',
+    'kjCode': 'code',
+    'kjName': 'name',
+    'kjTitle': 'title',
+    'kjXbrl': 'xbrl',
+    'kjPlace': 'exchange',
+    'kjFouter': 'history',
+}
+# Layout used when neither headers nor classes are present
+DEFAULT_COLUMNS = ['time', 'code', 'name', 'title', 'xbrl', 'exchange', 'history']
+
+CATEGORY_KEYWORDS = load_keywords("tdnet_categories", {
+    "revision": ["業績予想の修正", "差異"],
+    "dividend": ["配当", "剰余金の処分"],
+    "buyback": ["自己株式"],
+    "earnings": ["決算短信"],
+})
+_keyword_categories = {}
+for _category, _keywords in CATEGORY_KEYWORDS.items():
+    for _keyword in _keywords:
+        _keyword_categories.setdefault(_keyword, set()).add(_category)
+CATEGORY_MATCHER = KeywordMatcher(_keyword_categories)
+
+TIME_RE = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+@dataclass
+class Disclosure:
+    id: str # PDF file name (unique per disclosure)
+    time: str # HH:MM
+    code: str # 5-digit TDnet code (e.g. 72030)
+    name: str
+    title: str
+    pdf_link: str = None
+    xbrl_link: str = None
+    exchange: str = None
+    categories: set = field(default_factory=set)
+
+    @property
+    def ticker(self):
+        return self.code[:4] # 72030 -> 7203
+
+def classify(title):
+    """
+    Returns the set of categories (revision, dividend, buyback, earnings, ...) for a disclosure title.
+    """
+    categories = set()
+    for keyword in CATEGORY_MATCHER.find_all(title):
+        categories |= _keyword_categories[keyword]
+    return categories
+
+def find_main_table(soup):
+    table = soup.find('table', id='main-list-table')
+    if table:
+        return table
+    # Fallback: the table with TDnet title cells or a 表題 header
+    for t in soup.find_all('table'):
+        if t.find('td', class_='kjTitle') or any('表題' in th.get_text() for th in t.find_all('th')):
+            return t
+    return None
+
+def header_fields(table):
+    """
+    Returns [field or None] by column index from the table's <th> row, or None if there is none.
+    """
+    header = [th.get_text(strip=True) for th in table.find_all('th')]
+    if not header:
+        return None
+    fields = []
+    for text in header:
+        fields.append(next((f for prefix, f in HEADER_FIELDS if text.startswith(prefix)), None))
+    return fields
+
+def cell_field(td, index, columns):
+    for cls in td.get('class') or []:
+        if cls in CLASS_FIELDS:
+            return CLASS_FIELDS[cls]
+    return columns[index] if index < len(columns) else None
+
+def parse_listing(html):
+    """
+    Parses one listing page (HTML bytes/str or BeautifulSoup).
+    Returns [Disclosure] in page order (newest first).
+    """
+    soup = html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, 'html.parser')
+    table = find_main_table(soup)
+    if table is None:
+        return []
+    columns = header_fields(table) or DEFAULT_COLUMNS
+
+    items = []
+    for row in table.find_all('tr'):
+        cells = {}
+        links = {}
+        for i, td in enumerate(row.find_all('td')):
+            name = cell_field(td, i, columns)
+            if name and name not in cells:
+                cells[name] = td.get_text(strip=True)
+                a_tag = td.find('a', href=True)
+                if a_tag:
+                    links[name] = urljoin(TDNET_BASE_URL, a_tag['href'])
+
+        m = TIME_RE.match(cells.get('time', ''))
+        if not m or not cells.get('code') or not cells.get('title'):
+            continue # Header / spacer rows
+        time_text = f"{int(m.group(1)):02d}:{m.group(2)}"
+        pdf_link = links.get('title')
+
+        items.append(Disclosure(
+            id=pdf_link.rsplit('/', 1)[-1] if pdf_link else f"{time_text}-{cells['code']}-{cells['title']}",
+            time=time_text,
+            code=cells['code'],
+            name=cells.get('name', ''),
+            title=cells['title'],
+            pdf_link=pdf_link,
+            xbrl_link=links.get('xbrl'),
+            exchange=cells.get('exchange') or None,
+            categories=classify(cells['title']),
+        ))
+    return items
@@ -0,0 +1,233 @@
+import io
+import re
+import json
+import zipfile
+from html.parser import HTMLParser
+import http_client
+
+# XBRL path for TDnet disclosures that ship a summary XBRL zip (業績予想の修正, 決算短信).
+# The zip is downloaded into memory and its inline-XBRL (.htm) members are stream-parsed
+# without extracting to disk. Forecast facts are mapped to the revisions columns
+# prev_sales/prev_op/prev_net, rev_sales/rev_op/rev_net (millions of yen),
+# and revision_rate_op is computed from them.
+#
+# Example fact (TSE taxonomy):
+#   <ix:nonFraction name="tse-ed-t:OperatingIncome" scale="6" sign="-"
+#       contextRef="CurrentYearDuration_ConsolidatedMember_PreviousMember_ForecastMember">1,000</ix:nonFraction>
+
+MAX_ZIP_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Element local name (without taxonomy prefix) -> field
+ELEMENT_FIELDS = [
+    ('sales', re.compile(r'^(?:NetSales|Revenues?|OperatingRevenues?|OrdinaryRevenues?|GrossOperatingRevenues?)(?:IFRS|US|JMIS)?$')),
+    ('op', re.compile(r'^(?:OperatingIncome|OperatingProfit)(?:IFRS|US|JMIS)?$')),
+    ('ordinary', re.compile(r'^(?:OrdinaryIncome|ProfitBeforeTax|IncomeBeforeIncomeTaxes)(?:IFRS|US|JMIS)?$')),
+    ('net', re.compile(r'^(?:ProfitAttributableToOwnersOfParent|NetIncomeAttributableToOwnersOfParent|NetIncome|Profit)(?:IFRS|US|JMIS)?$')),
+]
+
+# Periods in order of preference (full year first)
+PERIOD_PRIORITY = ['CurrentYearDuration', 'NextYearDuration', 'CurrentAccumulatedQ2Duration']
+PERIOD_QUARTERS = {
+    'CurrentYearDuration': '通期',
+    'NextYearDuration': '通期',
+    'CurrentAccumulatedQ2Duration': '第2四半期',
+    'CurrentAccumulatedQ1Duration': '第1四半期',
+    'CurrentAccumulatedQ3Duration': '第3四半期',
+}
+
+class InlineXbrlFactParser(HTMLParser):
+    """
+    Collects ix:nonFraction facts: [{ name, context, value }] (value in yen, sign and scale applied).
+    html.parser lowercases tag and attribute names.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.facts = []
+        self.current = None
+        self.depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'ix:nonfraction':
+            attrs = dict(attrs)
+            if attrs.get('xsi:nil') == 'true':
+                return
+            self.current = {
+                'name': (attrs.get('name') or '').split(':')[-1],
+                'context': attrs.get('contextref') or '',
+                'scale': int(attrs.get('scale') or 0),
+                'negative': attrs.get('sign') == '-',
+                'text': '',
+            }
+            self.depth = 1
+        elif self.current is not None:
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        if self.current is None:
+            return
+        self.depth -= 1
+        if tag == 'ix:nonfraction' or self.depth <= 0:
+            fact, self.current = self.current, None
+            try:
+                value = float(fact['text'].replace(',', '').strip()) * (10 ** fact['scale'])
+            except ValueError:
+                return
+            self.facts.append({
+                'name': fact['name'],
+                'context': fact['context'],
+                'value': -value if fact['negative'] else value,
+            })
+
+    def handle_data(self, data):
+        if self.current is not None:
+            self.current['text'] += data
+
+def download_zip(url):
+    """
+    Returns the zip bytes (in memory, capped at MAX_ZIP_BYTES), or None.
+    """
+    try:
+        res = http_client.get(url, stream=True, timeout=30)
+        try:
+            if res.status_code != 200:
+                print(f"  XBRL download failed: {res.status_code}")
+                return None
+            buf = io.BytesIO()
+            for chunk in res.iter_content(CHUNK_SIZE):
+                buf.write(chunk)
+                if buf.tell() > MAX_ZIP_BYTES:
+                    print("  XBRL zip too large, skipped.")
+                    return None
+            return buf.getvalue()
+        finally:
+            res.close()
+    except Exception as e:
+        print(f"  XBRL download error: {e}")
+        return None
+
+def iter_facts(zip_bytes):
+    """
+    Yields facts from every inline-XBRL member, streamed member by member.
+    """
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        for info in zf.infolist():
+            name = info.filename.lower()
+            if not name.endswith(('.htm', '.html')) or 'ixbrl' not in name:
+                continue
+            parser = InlineXbrlFactParser()
+            with zf.open(info) as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    parser.feed(chunk.decode('utf-8', errors='ignore'))
+            parser.close()
+            yield from parser.facts
+
+def element_field(name):
+    if name.startswith('Change'):
+        return None # 増減率 / 増減額
+    for key, pattern in ELEMENT_FIELDS:
+        if pattern.match(name):
+            return key
+    return None
+
+def extract_forecast(facts):
+    """
+    Returns { quarter, previous: {sales, op, ordinary, net}, revised: {...} } in millions of yen, or None.
+    previous = 前回発表予想 (PreviousMember), revised = 今回修正予想 / new forecast.
+    Consolidated figures win over non-consolidated; ranges (Upper/Lower) are skipped.
+    """
+    found = {} # (period, kind, field) -> (rank, value)
+    for fact in facts:
+        key = element_field(fact['name'])
+        if not key:
+            continue
+        tokens = fact['context'].split('_')
+        members = set(tokens[1:])
+        if 'ForecastMember' not in members or members & {'UpperMember', 'LowerMember', 'ResultMember'}:
+            continue
+        if any('Change' in m for m in members):
+            continue
+        kind = 'previous' if 'PreviousMember' in members else 'revised'
+        rank = 0 if 'NonConsolidatedMember' not in members else 1
+        slot = (tokens[0], kind, key)
+        if slot not in found or rank < found[slot][0]:
+            found[slot] = (rank, round(fact['value'] / 1000000, 1))
+
+    periods = {period for period, _, _ in found}
+    if not periods:
+        return None
+    period = next((p for p in PERIOD_PRIORITY if p in periods), sorted(periods)[0])
+
+    forecast = {'quarter': PERIOD_QUARTERS.get(period, '通期'), 'previous': {}, 'revised': {}}
+    for key, _ in ELEMENT_FIELDS:
+        for kind in ('previous', 'revised'):
+            value = found.get((period, kind, key))
+            forecast[kind][key] = value[1] if value else None
+    if all(v is None for v in forecast['revised'].values()):
+        return None
+    return forecast
+
+def revision_numbers(forecast):
+    """
+    Deterministic analysis: { is_upward, revision_rate_op } from operating profit, or {} if not comparable.
+    """
+    prev_op = forecast['previous'].get('op')
+    rev_op = forecast['revised'].get('op')
+    if prev_op is None or rev_op is None:
+        return {}
+    rate = round((rev_op - prev_op) / prev_op * 100, 1) if prev_op > 0 else 0.0
+    return {'is_upward': rev_op > prev_op, 'revision_rate_op': rate}
+
+def fetch_forecast(xbrl_url):
+    """
+    Downloads and parses a TDnet XBRL zip. Returns the forecast dict or None.
+    """
+    zip_bytes = download_zip(xbrl_url)
+    if not zip_bytes:
+        return None
+    try:
+        return extract_forecast(iter_facts(zip_bytes))
+    except (zipfile.BadZipFile, ValueError) as e:
+        print(f"  XBRL parse error: {e}")
+        return None
+
+def save_forecast(conn, revision_id, forecast):
+    """
+    Writes the XBRL numbers (and the deterministic rate) to the revisions row.
+    """
+    prev, rev = forecast['previous'], forecast['revised']
+    numbers = revision_numbers(forecast)
+    is_upward = numbers.get('is_upward')
+    forecast_data = dict(previous=prev, revised=rev, unit='単位: 百万円')
+    conn.execute("""
+        UPDATE revisions
+        SET prev_sales = ?, prev_op = ?, prev_net = ?,
+            rev_sales = ?, rev_op = ?, rev_net = ?,
+            revision_rate_op = COALESCE(?, revision_rate_op),
+            is_upward = COALESCE(?, is_upward),
+            forecast_data = ?,
+            quarter = ?
+        WHERE id = ?
+    """, (prev.get('sales'), prev.get('op'), prev.get('net'),
+          rev.get('sales'), rev.get('op'), rev.get('net'),
+          numbers.get('revision_rate_op'),
+          None if is_upward is None else (1 if is_upward else 0),
+          json.dumps(forecast_data, ensure_ascii=False),
+          forecast['quarter'],
+          revision_id))
+    return numbers
+
+def numbers_from_row(row):
+    """
+    Re-derives { is_upward, revision_rate_op } from a revisions row filled by save_forecast, or {}.
+    """
+    try:
+        prev_op, rev_op = row['prev_op'], row['rev_op']
+    except (IndexError, KeyError):
+        return {}
+    if prev_op is None or rev_op is None:
+        return {}
+    return revision_numbers({'previous': {'op': prev_op}, 'revised': {'op': rev_op}})
@@ -135,12 +135,22 @@ export function getLatestDividend(ticker: string): DividendInfo {
 
 // --- Data Fetching Helpers ---
 
+// News for an investor = own articles + canonical articles of stories linked via story_investors
+// (near-duplicates fetched under several investors are stored once, see backend/story_cluster.py)
+const INVESTOR_NEWS_IDS = `
+    SELECT id FROM news_items WHERE investor_id = :investorId
+    UNION
+    SELECT s.canonical_news_id FROM story_investors si
+    JOIN news_stories s ON s.id = si.story_id
+    WHERE si.investor_id = :investorId AND s.canonical_news_id IS NOT NULL
+`;
+
 export function getInvestors(): Investor[] {
     const stmt = db.prepare(`
         SELECT
             i.id, i.name, i.aliases, i.style_description,
             i.twitter_url, i.image_url, i.profile,
-            (SELECT COUNT(*) FROM news_items n WHERE n.investor_id = i.id) as news_count
+            (SELECT COUNT(*) FROM (${INVESTOR_NEWS_IDS.replaceAll(':investorId', 'i.id')})) as news_count
         FROM investors i
     `);
     return stmt.all() as Investor[];
@@ -156,15 +166,15 @@ export function getNewsByInvestor(investorId: string | number, page: number = 1,
     const offset = (page - 1) * limit;
 
     const stmt = db.prepare(`
-        SELECT * FROM news_items 
-        WHERE investor_id = ? 
-        ORDER BY published_at DESC 
-        LIMIT ? OFFSET ?
+        SELECT n.* FROM news_items n
+        WHERE n.id IN (${INVESTOR_NEWS_IDS})
+        ORDER BY n.published_at DESC 
+        LIMIT :limit OFFSET :offset
     `);
-    const news = stmt.all(investorId, limit, offset) as NewsItem[];
+    const news = stmt.all({ investorId, limit, offset }) as NewsItem[];
 
-    const countStmt = db.prepare('SELECT COUNT(*) as total FROM news_items WHERE investor_id = ?');
-    const total = (countStmt.get(investorId) as { total: number }).total;
+    const countStmt = db.prepare(`SELECT COUNT(*) as total FROM (${INVESTOR_NEWS_IDS})`);
+    const total = (countStmt.get({ investorId }) as { total: number }).total;
 
 
 